@@ -0,0 +1,315 @@
+"""
+Per-user admission control for lambda_handler.
+
+Every (bot name, userId) pair gets a token bucket that refills at ADMISSION_RATE tokens per second up to
+ADMISSION_BURST.  An event that finds its bucket empty is answered with a pre-built Close/Failed response before any
+validation or backend work happens.  Buckets live in an in-process map by default; hosts that run several worker
+processes can share them through SQLite (ADMISSION_BACKEND=sqlite:///path/to/buckets.db) or pass a Redis-compatible
+client to configure().  Setting ADMISSION_RATE to 0 turns admission control off.
+
+The limits and the admitted/shed counters are written to stdout as CloudWatch embedded metric format (EMF) lines every
+METRICS_INTERVAL seconds, and at most once a second while events are being shed, so CloudWatch turns them into metrics
+in ADMISSION_METRICS_NAMESPACE without any extra API calls.
+"""
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from lex_responses import THROTTLED
+
+logger = logging.getLogger()
+
+# EMF lines must reach stdout as bare JSON, without the prefix the Lambda runtime's root handler adds.
+metrics_logger = logging.getLogger('admission.metrics')
+metrics_logger.setLevel(logging.INFO)
+metrics_logger.propagate = False
+_metrics_handler = logging.StreamHandler(sys.stdout)
+_metrics_handler.setFormatter(logging.Formatter('%(message)s'))
+metrics_logger.addHandler(_metrics_handler)
+
+
+DEFAULT_RATE = 2.0
+DEFAULT_BURST = 10.0
+DEFAULT_MAX_KEYS = 100000
+
+METRICS_NAMESPACE = os.environ.get('ADMISSION_METRICS_NAMESPACE', 'BookTrip/Admission')
+METRICS_INTERVAL = 60.0
+SHED_METRICS_INTERVAL = 1.0
+
+
+class MemoryBuckets:
+    """
+    Token buckets in a map ordered by last use.  A bucket idle for longer than it takes to refill completely is
+    indistinguishable from a new one, so it is dropped.  Only those are dropped: forgetting a bucket that is still
+    refilling would hand its user a fresh burst, so once max_keys buckets are refilling, events from new keys are shed.
+    """
+
+    def __init__(self, rate, burst, max_keys=DEFAULT_MAX_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.ttl = burst / rate
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, now):
+        with self.lock:
+            self.evict(now)
+            bucket = self.buckets.pop(key, None)
+            if bucket is None:
+                if len(self.buckets) >= self.max_keys:
+                    return False
+                tokens = self.burst
+            else:
+                tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            admitted = tokens >= 1
+            if admitted:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            return admitted
+
+    def evict(self, now):
+        buckets = self.buckets
+        while buckets:
+            key, (_, last_used) = next(iter(buckets.items()))
+            if now - last_used <= self.ttl:
+                break
+            del buckets[key]
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+class SQLiteBuckets:
+    """
+    Token buckets in a SQLite file shared by every process on the host.
+    """
+
+    PURGE_EVERY = 10000
+
+    def __init__(self, rate, burst, path):
+        self.rate = rate
+        self.burst = burst
+        self.ttl = burst / rate
+        self.calls = 0
+        self.connection = sqlite3.connect(path, timeout=1.0, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # In WAL mode NORMAL syncs at checkpoints instead of on every commit.  A crash can lose the last few bucket
+        # updates, which only hands those users a slightly fuller bucket.
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS admission_buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)'
+        )
+
+    def take(self, key, now):
+        with self.lock:
+            cursor = self.connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                row = cursor.execute('SELECT tokens, updated FROM admission_buckets WHERE key = ?', (key,)).fetchone()
+                tokens = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+                admitted = tokens >= 1
+                if admitted:
+                    tokens -= 1
+                cursor.execute('INSERT OR REPLACE INTO admission_buckets VALUES (?, ?, ?)', (key, tokens, now))
+                self.calls += 1
+                if self.calls % self.PURGE_EVERY == 0:
+                    cursor.execute('DELETE FROM admission_buckets WHERE updated < ?', (now - self.ttl,))
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+            return admitted
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM admission_buckets').fetchone()[0]
+
+
+class RedisBuckets:
+    """
+    Token buckets in Redis, or anything that implements EVAL, through a client such as redis.Redis.
+    """
+
+    SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens = burst
+    if bucket[1] then
+        tokens = math.min(burst, tonumber(bucket[1]) + (now - tonumber(bucket[2])) * rate)
+    end
+    local admitted = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        admitted = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+    return admitted
+    """
+
+    def __init__(self, rate, burst, client, prefix='admission:'):
+        self.rate = rate
+        self.burst = burst
+        self.client = client
+        self.prefix = prefix
+
+    def take(self, key, now):
+        return bool(self.client.eval(self.SCRIPT, 1, self.prefix + key, self.rate, self.burst, now))
+
+    def __len__(self):
+        return 0
+
+
+# --- Module state used by lambda_handler ---
+
+
+# Source of the current time for the buckets; benchmarks replace it to make runs independent of machine speed.
+clock = time.time
+
+_backend = None
+_metrics = {'admitted': 0, 'shed': 0, 'backend_errors': 0}
+_shed_by_bot = {}
+_metrics_lock = threading.Lock()
+# Counters as of the last EMF line, which reports the difference.
+_emitted = {'at': 0.0, 'admitted': 0, 'shed': 0, 'backend_errors': 0, 'shed_by_bot': {}}
+
+THROTTLED_DIALOG_ACTION = {
+    'type': 'Close',
+    'fulfillmentState': 'Failed',
+    'message': THROTTLED
+}
+
+
+def configure(rate=None, burst=None, backend=None, client=None):
+    """
+    (Re)configure admission control.  Unset arguments come from the environment.
+
+    backend is None for the in-process map, 'sqlite:///path' for a shared SQLite file, or 'redis' together with a
+    Redis-compatible client.
+    """
+    global _backend
+    rate = float(os.environ.get('ADMISSION_RATE', DEFAULT_RATE)) if rate is None else rate
+    burst = float(os.environ.get('ADMISSION_BURST', DEFAULT_BURST)) if burst is None else burst
+    backend = os.environ.get('ADMISSION_BACKEND', '') if backend is None else backend
+
+    if rate <= 0:
+        _backend = None
+    elif backend.startswith('sqlite://'):
+        _backend = SQLiteBuckets(rate, burst, backend[len('sqlite://'):])
+    elif backend == 'redis':
+        if client is None:
+            raise ValueError('The redis admission backend needs a client')
+        _backend = RedisBuckets(rate, burst, client)
+    elif backend:
+        raise ValueError('Unknown admission backend {}'.format(backend))
+    else:
+        _backend = MemoryBuckets(rate, burst)
+    return _backend
+
+
+def admit(event):
+    """
+    Take a token for the event's bot and user.  Returns False when the event should be shed.
+    """
+    if _backend is None:
+        return True
+    bot_name = event['bot']['name']
+    now = clock()
+    try:
+        admitted = _backend.take('{}\x00{}'.format(bot_name, event['userId']), now)
+        failed = False
+    except Exception:
+        # A shared backend that is down must not take the bot down with it.
+        logger.exception('admission backend failed')
+        admitted = True
+        failed = True
+    with _metrics_lock:
+        if failed:
+            _metrics['backend_errors'] += 1
+        if admitted:
+            _metrics['admitted'] += 1
+        else:
+            _metrics['shed'] += 1
+            _shed_by_bot[bot_name] = _shed_by_bot.get(bot_name, 0) + 1
+        since_emitted = now - _emitted['at']
+        due = since_emitted >= METRICS_INTERVAL or (not admitted and since_emitted >= SHED_METRICS_INTERVAL)
+        if due:
+            _emitted['at'] = now
+    if due:
+        emit_metrics(now)
+    return admitted
+
+
+def throttled_response(event):
+    return {
+        'sessionAttributes': event.get('sessionAttributes') or {},
+        'dialogAction': THROTTLED_DIALOG_ACTION
+    }
+
+
+def metrics():
+    """
+    Snapshot of the admission limits and counters since the process started.
+    """
+    backend = _backend
+    with _metrics_lock:
+        counters = dict(_metrics, shed_by_bot=dict(_shed_by_bot))
+    return dict(
+        counters,
+        enabled=backend is not None,
+        rate=backend.rate if backend is not None else 0,
+        burst=backend.burst if backend is not None else 0,
+        tracked_keys=len(backend) if backend is not None else 0
+    )
+
+
+def _emf(timestamp, dimensions, values, properties):
+    document = {
+        '_aws': {
+            'Timestamp': int(timestamp * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [list(dimensions)],
+                'Metrics': [{'Name': name, 'Unit': 'Count'} for name in values],
+            }],
+        },
+    }
+    document.update(dimensions)
+    document.update(values)
+    document.update(properties)
+    return json.dumps(document, separators=(',', ':'))
+
+
+def emit_metrics(now=None):
+    """
+    Write the counters since the previous call as EMF lines: one with the totals and one per bot that shed events.
+    """
+    now = clock() if now is None else now
+    with _metrics_lock:
+        counters = {name: _metrics[name] - _emitted[name] for name in ('admitted', 'shed', 'backend_errors')}
+        shed_by_bot = {bot_name: shed - _emitted['shed_by_bot'].get(bot_name, 0)
+                       for bot_name, shed in _shed_by_bot.items()}
+        _emitted.update(_metrics, at=now, shed_by_bot=dict(_shed_by_bot))
+    snapshot = metrics()
+    metrics_logger.info(_emf(now, {}, {
+        'Admitted': counters['admitted'],
+        'Shed': counters['shed'],
+        'BackendErrors': counters['backend_errors'],
+    }, {
+        'Enabled': snapshot['enabled'],
+        'Rate': snapshot['rate'],
+        'Burst': snapshot['burst'],
+        'TrackedKeys': snapshot['tracked_keys'],
+    }))
+    for bot_name, shed in sorted(shed_by_bot.items()):
+        if shed:
+            metrics_logger.info(_emf(now, {'BotName': bot_name}, {'Shed': shed}, {}))
+
+
+configure()
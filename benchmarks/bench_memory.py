@@ -0,0 +1,263 @@
+"""
+Memory footprint benchmark for lambda_function, checked against the budgets in memory_budgets.json.
+
+Measures:
+  - import footprint: bytes traced by tracemalloc and resident set growth while importing lambda_function,
+    measured in a fresh interpreter;
+  - per turn, for every intent and dialog path: peak traced bytes during the turn, the number of traced allocations
+    made by the turn that are still alive once it returns (retained_allocations, from a tracemalloc snapshot diff: the
+    response itself plus anything a cache kept) and the net change in the interpreter's allocated block count.
+    tracemalloc only sees live blocks, so allocations freed before the turn returns are not counted; they show up
+    in peak_bytes only;
+  - steady state: traced bytes retained across many simulated turns, which catches caches that grow without bound.
+    Admission control runs on a simulated clock that advances TURN_SECONDS per turn, so every run dispatches and
+    sheds the same turns whatever the speed of the machine.
+
+The report is written as JSON (to stdout or --report) and the exit status is 1 when any budget is exceeded.
+
+Run from the repository root:
+    python benchmarks/bench_memory.py [--turns 100000] [--report memory_report.json]
+"""
+import argparse
+import copy
+import datetime
+import gc
+import json
+import logging
+import math
+import os
+import subprocess
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BUDGETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'memory_budgets.json')
+
+# Simulated time between steady-state turns.  With the default 1000 users each one sends a turn a second, inside the
+# default admission rate, so every turn is dispatched.
+TURN_SECONDS = 0.001
+
+# Allocations made by the measurement itself.
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+)
+
+IMPORT_PROBE = """
+import json, resource, sys, tracemalloc
+sys.path.insert(0, {root!r})
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+tracemalloc.start()
+import lambda_function
+current, peak = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'traced_bytes': current, 'traced_peak_bytes': peak, 'rss_growth_kb': rss_after - rss_before}}))
+"""
+
+
+def day(offset):
+    return (datetime.date.today() + datetime.timedelta(days=offset)).isoformat()
+
+
+# BookTripTestTwo has a definition file, which has no BookFlight intent; flight turns go to a bot without one, so
+# they are served by the registry's default bot.
+FLIGHT_BOT = 'BookTripBenchmark'
+
+
+def event(intent_name, slots, confirmation_status='None', session_attributes=None,
+          invocation_source='DialogCodeHook', user_id='bench-user', bot_name='BookTripTestTwo'):
+    return {
+        'messageVersion': '1.0',
+        'invocationSource': invocation_source,
+        'userId': user_id,
+        'sessionAttributes': session_attributes,
+        'bot': {'name': bot_name, 'alias': '$LATEST', 'version': '$LATEST'},
+        'outputDialogMode': 'Text',
+        'currentIntent': {'name': intent_name, 'slots': slots, 'confirmationStatus': confirmation_status},
+    }
+
+
+def hotel_slots(**values):
+    slots = {'Location': None, 'CheckInDate': None, 'Nights': None, 'RoomType': None}
+    slots.update(values)
+    return slots
+
+
+def car_slots(**values):
+    slots = {'PickUpCity': None, 'PickUpDate': None, 'ReturnDate': None, 'DriverAge': None, 'CarType': None}
+    slots.update(values)
+    return slots
+
+
+def flight_slots(**values):
+    slots = {'Arrival_Country': None, 'Arrival_City': None, 'Leave_Date': None, 'Return_Date': None,
+             'Cabin_Type': None, 'Amount': None}
+    slots.update(values)
+    return slots
+
+
+# A previous car reservation in the shape book_car reads when it offers to auto-populate a rental.
+LAST_CAR_RESERVATION = json.dumps({'ReservationType': 'Car', 'Location': 'sydney', 'CheckInDate': day(5), 'Nights': 3})
+
+
+def scenarios():
+    """
+    One event per intent and dialog path, keyed by a stable scenario name used in the budgets file.
+    """
+    return {
+        'book_hotel.delegate': event('BookHotel', hotel_slots(Location='sydney', CheckInDate=day(3), Nights='2')),
+        'book_hotel.invalid_city': event('BookHotel', hotel_slots(Location='atlantis')),
+        'book_hotel.invalid_nights': event('BookHotel', hotel_slots(Location='perth', Nights='45')),
+        'book_car.delegate': event('BookCar', car_slots(PickUpCity='boston', PickUpDate=day(2), ReturnDate=day(6))),
+        'book_car.invalid_pickup_date': event('BookCar', car_slots(PickUpCity='boston', PickUpDate=day(0))),
+        'book_car.invalid_span': event('BookCar', car_slots(PickUpDate=day(2), ReturnDate=day(40))),
+        'book_car.invalid_age': event('BookCar', car_slots(DriverAge='16')),
+        'book_car.confirm_autopopulate': event(
+            'BookCar', car_slots(), session_attributes={'lastConfirmedReservation': LAST_CAR_RESERVATION}
+        ),
+        'book_car.confirmed_ask_age': event(
+            'BookCar', car_slots(PickUpCity='sydney', PickUpDate=day(5), ReturnDate=day(8)), 'Confirmed',
+            {'confirmationContext': 'AutoPopulate'}
+        ),
+        'book_car.denied_autopopulate': event(
+            'BookCar', car_slots(PickUpCity='sydney'), 'Denied', {'confirmationContext': 'AutoPopulate'}
+        ),
+        'book_car.fulfilled': event(
+            'BookCar', car_slots(PickUpCity='sydney', PickUpDate=day(2), ReturnDate=day(4), DriverAge='30',
+                                 CarType='economy'), 'Confirmed', invocation_source='FulfillmentCodeHook'
+        ),
+        'book_flight.delegate': event('BookFlight', flight_slots(Arrival_City='sydney'), bot_name=FLIGHT_BOT),
+        'book_flight.denied_autopopulate': event(
+            'BookFlight', flight_slots(), 'Denied', {'confirmationContext': 'AutoPopulate'}, bot_name=FLIGHT_BOT
+        ),
+        'book_flight.confirmed_ask_amount': event(
+            'BookFlight', flight_slots(Arrival_City='sydney'), 'Confirmed', {'confirmationContext': 'AutoPopulate'},
+            bot_name=FLIGHT_BOT
+        ),
+    }
+
+
+def measure_import():
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_PROBE.format(root=ROOT)], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_turn(handler, template, warmup=50):
+    for _ in range(warmup):
+        handler(copy.deepcopy(template), None)
+    request = copy.deepcopy(template)
+    gc.collect()
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+    tracemalloc.reset_peak()
+    blocks_before = sys.getallocatedblocks()
+    before, _ = tracemalloc.get_traced_memory()
+    response = handler(request, None)
+    after, peak = tracemalloc.get_traced_memory()
+    blocks_after = sys.getallocatedblocks()
+    snapshot_after = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+    tracemalloc.stop()
+    del response
+    retained_allocations = sum(
+        max(stat.count_diff, 0) for stat in snapshot_after.compare_to(snapshot_before, 'traceback')
+    )
+    return {'peak_bytes': peak - before, 'retained_bytes': after - before, 'retained_allocations': retained_allocations,
+            'retained_blocks': blocks_after - blocks_before}
+
+
+def measure_steady_state(handler, templates, turns, users, clock):
+    """
+    Run turns cycling through every scenario and users distinct user ids, and report how much traced memory is
+    still held after the first tenth of the run, or once every user has sent every scenario if that is later, compared
+    with the end.  clock is a one-item list holding the
+    simulated time admission control sees; it advances TURN_SECONDS per turn.
+    """
+    names = sorted(templates)
+    checkpoint = min(max(turns // 10, math.lcm(users, len(names)), 1), turns)
+    tracemalloc.start()
+    baseline = None
+    for turn in range(turns):
+        request = copy.deepcopy(templates[names[turn % len(names)]])
+        request['userId'] = 'user-{}'.format(turn % users)
+        clock[0] += TURN_SECONDS
+        handler(request, None)
+        if turn + 1 == checkpoint:
+            gc.collect()
+            baseline = tracemalloc.get_traced_memory()[0]
+    gc.collect()
+    final = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {'turns': turns, 'users': users, 'baseline_bytes': baseline, 'final_bytes': final,
+            'growth_bytes': final - baseline}
+
+
+def check_budgets(report, budgets):
+    violations = []
+
+    def check(name, value, limit):
+        if limit is not None and value > limit:
+            violations.append({'metric': name, 'value': value, 'budget': limit})
+
+    check('import.traced_bytes', report['import']['traced_bytes'], budgets.get('import_traced_bytes'))
+    check('import.rss_growth_kb', report['import']['rss_growth_kb'], budgets.get('import_rss_growth_kb'))
+    turn_budgets = budgets.get('per_turn', {})
+    for name, result in report['per_turn'].items():
+        limits = turn_budgets.get(name, turn_budgets.get('default', {}))
+        check(name + '.peak_bytes', result['peak_bytes'], limits.get('peak_bytes'))
+        check(name + '.retained_allocations', result['retained_allocations'], limits.get('retained_allocations'))
+        check(name + '.retained_blocks', result['retained_blocks'], limits.get('retained_blocks'))
+    check('steady_state.growth_bytes', report['steady_state']['growth_bytes'],
+          budgets.get('steady_state_growth_bytes'))
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--turns', type=int, default=100000, help='turns in the steady-state run')
+    parser.add_argument('--users', type=int, default=1000, help='distinct user ids in the steady-state run')
+    parser.add_argument('--budgets', default=BUDGETS_PATH, help='budgets file')
+    parser.add_argument('--report', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    import admission
+    import lambda_function
+
+    # Admission control would shed the repeated turns of a single benchmark user; the steady-state run re-enables it
+    # with the default limits so that its bucket map is part of what is measured.
+    admission.configure(rate=0)
+    templates = scenarios()
+    report = {
+        'import': measure_import(),
+        'per_turn': {name: measure_turn(lambda_function.lambda_handler, template)
+                     for name, template in sorted(templates.items())},
+    }
+    admission.configure(rate=admission.DEFAULT_RATE, burst=admission.DEFAULT_BURST, backend='')
+    clock = [0.0]
+    admission.clock = lambda: clock[0]
+    shed_before = admission.metrics()['shed']
+    report['steady_state'] = measure_steady_state(
+        lambda_function.lambda_handler, templates, args.turns, args.users, clock
+    )
+    report['steady_state']['shed'] = admission.metrics()['shed'] - shed_before
+
+    with open(args.budgets) as budgets_file:
+        report['violations'] = check_budgets(report, json.load(budgets_file))
+    report['passed'] = not report['violations']
+
+    if args.report:
+        with open(args.report, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return 0 if report['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Benchmark the pre-encoded response layer in lex_responses against the dict builders in lambda_function.
+
+Each case compares building the response dict and serializing it to bytes with json.dumps (what the Lambda runtime
+does today) with writing the same response straight to bytes from the pre-encoded fragments.
+
+Run from the repository root:
+    python benchmarks/bench_responses.py [--number N]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lambda_function
+import lex_responses
+
+
+SESSION_ATTRIBUTES = {
+    'currentReservation': json.dumps({
+        'ReservationType': 'Car',
+        'PickUpCity': 'sydney',
+        'PickUpDate': '2022-06-30',
+        'ReturnDate': '2022-07-03',
+        'CarType': 'economy'
+    })
+}
+SLOTS = {'PickUpCity': 'sydney', 'PickUpDate': None, 'ReturnDate': '2022-07-03', 'DriverAge': '25', 'CarType': 'economy'}
+REPROMPT = lambda_function.build_validation_result(
+    False, 'PickUpDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?'
+)['message']
+
+CASES = (
+    (
+        'elicit_slot',
+        lambda: json.dumps(
+            lambda_function.elicit_slot(SESSION_ATTRIBUTES, 'BookCar', SLOTS, 'PickUpDate', REPROMPT)
+        ).encode('utf-8'),
+        lambda: lex_responses.encode_elicit_slot(SESSION_ATTRIBUTES, 'BookCar', SLOTS, 'PickUpDate', REPROMPT)
+    ),
+    (
+        'confirm_intent',
+        lambda: json.dumps(
+            lambda_function.confirm_intent(SESSION_ATTRIBUTES, 'BookCar', SLOTS, lex_responses.ASK_CAR_CITY)
+        ).encode('utf-8'),
+        lambda: lex_responses.encode_confirm_intent(SESSION_ATTRIBUTES, 'BookCar', SLOTS, lex_responses.ASK_CAR_CITY)
+    ),
+    (
+        'close',
+        lambda: json.dumps(
+            lambda_function.close(SESSION_ATTRIBUTES, 'Fulfilled', lex_responses.RESERVATION_PLACED)
+        ).encode('utf-8'),
+        lambda: lex_responses.encode_close(SESSION_ATTRIBUTES, 'Fulfilled', lex_responses.RESERVATION_PLACED)
+    ),
+    (
+        'delegate',
+        lambda: json.dumps(lambda_function.delegate(SESSION_ATTRIBUTES, SLOTS)).encode('utf-8'),
+        lambda: lex_responses.encode_delegate(SESSION_ATTRIBUTES, SLOTS)
+    ),
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=100000, help='calls per timing run')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs per case, the best one is reported')
+    args = parser.parse_args()
+
+    print('{:<16}{:>14}{:>14}{:>10}'.format('case', 'dict+dumps us', 'encoded us', 'speedup'))
+    for name, baseline, encoded in CASES:
+        # Both paths have to produce the same document before their timings mean anything.
+        assert json.loads(baseline()) == json.loads(encoded()), name
+        baseline_time = min(timeit.repeat(baseline, number=args.number, repeat=args.repeat)) / args.number
+        encoded_time = min(timeit.repeat(encoded, number=args.number, repeat=args.repeat)) / args.number
+        print('{:<16}{:>14.3f}{:>14.3f}{:>9.2f}x'.format(
+            name, baseline_time * 1e6, encoded_time * 1e6, baseline_time / encoded_time
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""
+Compiled bot definitions for serving several bots from one warm process.
+
+A BotRegistry finds a bot's export JSON (such as 'BookTripTestTwo_Export 2.json') by bot name and version the first
+time an event for it arrives, compiles it into a CompiledBot and keeps it in a least-recently-used cache bounded both
+by the number of bots and by their estimated size in bytes.  Events for a bot without a definition file are served by
+the registry's default bot, which handles every intent the process knows with the built-in vocabulary.
+"""
+import functools
+import glob
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger()
+
+
+# Vocabulary each slot name feeds when its slot type is a custom type with enumeration values in the definition.
+SLOT_VOCABULARIES = {
+    'Location': 'cities',
+    'PickUpCity': 'cities',
+    'ArrivalCity': 'cities',
+    'Arrival_City': 'cities',
+    'CarType': 'car_types',
+    'RoomType': 'room_types',
+    'CabinType': 'cabin_types',
+    'Cabin_Type': 'cabin_types',
+}
+
+# Shortest time between two indexings of the definitions directory triggered by bot names it does not know.
+MISSING_DEFINITION_RETRY = 60.0
+
+
+class CompiledBot:
+    """
+    One bot version ready to dispatch: intent name to handler, with its vocabulary already bound.
+    """
+    __slots__ = ('name', 'version', 'intents', 'vocabulary', 'size')
+
+    def __init__(self, name, version, intents, vocabulary):
+        self.name = name
+        self.version = version
+        self.intents = intents
+        self.vocabulary = vocabulary
+        self.size = estimate_size(intents, vocabulary)
+
+
+def estimate_size(intents, vocabulary):
+    """
+    Rough number of bytes held by a compiled bot: its dispatch table and every vocabulary set and string in it.
+    """
+    size = sys.getsizeof(intents) + sys.getsizeof(vocabulary)
+    for name, handler in intents.items():
+        size += sys.getsizeof(name) + sys.getsizeof(handler)
+    seen = set()
+    for values in vocabulary.values():
+        if id(values) in seen:
+            continue
+        seen.add(id(values))
+        size += sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+    return size
+
+
+def compile_bot(resource, handlers, default_vocabulary):
+    """
+    Compile the 'resource' part of a bot export.  Intents without a handler are left out of the dispatch table.
+    """
+    slot_type_values = {}
+    for slot_type in resource.get('slotTypes', []):
+        values = set()
+        for enumeration_value in slot_type.get('enumerationValues', []):
+            values.add(enumeration_value['value'].lower())
+            values.update(synonym.lower() for synonym in enumeration_value.get('synonyms', []))
+        if values:
+            slot_type_values[slot_type['name']] = values
+
+    custom_vocabulary = {}
+    intents = {}
+    for intent in resource.get('intents', []):
+        for slot in intent.get('slots', []):
+            vocabulary_name = SLOT_VOCABULARIES.get(slot['name'])
+            values = slot_type_values.get(slot.get('slotType'))
+            if vocabulary_name and values:
+                custom_vocabulary.setdefault(vocabulary_name, set()).update(values)
+        if intent['name'] in handlers:
+            intents[intent['name']] = handlers[intent['name']]
+        else:
+            logger.debug('bot {} intent {} has no handler'.format(resource['name'], intent['name']))
+
+    vocabulary = dict(default_vocabulary)
+    vocabulary.update((name, frozenset(values)) for name, values in custom_vocabulary.items())
+    bound = {name: functools.partial(handler, vocabulary=vocabulary) for name, handler in intents.items()}
+    return CompiledBot(resource['name'], str(resource.get('version', '$LATEST')), bound, vocabulary)
+
+
+def _version_key(version):
+    return (0, int(version)) if version.isdigit() else (-1, version)
+
+
+class BotRegistry:
+    """
+    Lazily loaded, LRU-bounded cache of compiled bots keyed by (bot name, resolved version).
+
+    The definitions directory is indexed once by each export's resource name and version, so looking up a bot, known
+    or not, never reads the directory on the request path.  The index is rebuilt at most every
+    MISSING_DEFINITION_RETRY seconds, when an event names a bot it does not know.  Requested versions such as
+    '$LATEST' are aliases of the version they resolve to, which is compiled and cached once.
+    """
+
+    def __init__(self, handlers, default_vocabulary, definitions_dir, max_bots=16, max_bytes=32 * 1024 * 1024):
+        self.handlers = handlers
+        self.default_vocabulary = default_vocabulary
+        self.definitions_dir = definitions_dir
+        self.max_bots = max_bots
+        self.max_bytes = max_bytes
+        self.default_bot = CompiledBot(
+            '', '$LATEST',
+            {name: functools.partial(handler, vocabulary=default_vocabulary) for name, handler in handlers.items()},
+            default_vocabulary
+        )
+        self.bots = OrderedDict()
+        self.total_bytes = 0
+        # (name, requested version) -> (name, resolved version)
+        self.aliases = {}
+        # name -> {version: path}
+        self.index = None
+        self.indexed_at = 0.0
+        self.lock = threading.Lock()
+        self.counts = {'hits': 0, 'compiled': 0, 'evicted': 0, 'defaulted': 0, 'indexed': 0}
+
+    def get(self, bot):
+        """
+        Return the CompiledBot for the 'bot' object of a Lex event ({'name': ..., 'version': ...}).
+        """
+        name = bot.get('name', '')
+        version = str(bot.get('version') or '$LATEST')
+        with self.lock:
+            key = self.aliases.get((name, version))
+            compiled = self.bots.get(key) if key is not None else None
+            if compiled is not None:
+                self.bots.move_to_end(key)
+                self.counts['hits'] += 1
+                return compiled
+
+        resolved = self.resolve(name, version)
+        if resolved is None:
+            with self.lock:
+                self.counts['defaulted'] += 1
+            return self.default_bot
+        key = (name, resolved[0])
+        with self.lock:
+            self.alias(name, version, key)
+            compiled = self.bots.get(key)
+            if compiled is not None:
+                self.bots.move_to_end(key)
+                self.counts['hits'] += 1
+                return compiled
+
+        # Read and compile outside the lock; a racing thread compiling the same bot only costs duplicate work.
+        resource = self.read_definition(resolved[1], name)
+        if resource is None:
+            with self.lock:
+                self.counts['defaulted'] += 1
+            return self.default_bot
+        compiled = compile_bot(resource, self.handlers, self.default_vocabulary)
+        with self.lock:
+            if key in self.bots:
+                self.bots.move_to_end(key)
+                return self.bots[key]
+            self.counts['compiled'] += 1
+            self.bots[key] = compiled
+            self.total_bytes += compiled.size
+            self.evict()
+            return compiled
+
+    def alias(self, name, version, key):
+        if len(self.aliases) >= 1024:
+            self.aliases.clear()
+        self.aliases[(name, version)] = key
+
+    def evict(self):
+        # The newest bot always stays, even when on its own it is over the byte budget.
+        while len(self.bots) > 1 and (len(self.bots) > self.max_bots or self.total_bytes > self.max_bytes):
+            _, evicted = self.bots.popitem(last=False)
+            self.total_bytes -= evicted.size
+            self.counts['evicted'] += 1
+
+    def resolve(self, name, version):
+        """
+        Return (resolved version, path) of the export serving name and version, or None when there is none.
+        '$LATEST', or a version with no export of its own, resolves to the highest version there is.
+        """
+        index = self.index
+        if index is None or (name not in index and time.monotonic() - self.indexed_at >= MISSING_DEFINITION_RETRY):
+            index = self.build_index()
+        versions = index.get(name)
+        if not versions:
+            return None
+        if version in versions:
+            return version, versions[version]
+        latest = max(versions, key=_version_key)
+        if version != '$LATEST':
+            logger.debug('bot {} has no version {}, using version {}'.format(name, version, latest))
+        return latest, versions[latest]
+
+    def build_index(self):
+        """
+        Read every export in the definitions directory once and map resource name and version to its path.
+        """
+        index = {}
+        pattern = os.path.join(glob.escape(self.definitions_dir), '*.json')
+        for path in sorted(glob.glob(pattern)):
+            resource = self.read_definition(path)
+            if resource is not None:
+                index.setdefault(resource['name'], {})[str(resource.get('version', '$LATEST'))] = path
+        with self.lock:
+            self.index = index
+            self.indexed_at = time.monotonic()
+            # '$LATEST' may resolve differently now.
+            self.aliases.clear()
+            self.counts['indexed'] += 1
+        return index
+
+    @staticmethod
+    def read_definition(path, name=None):
+        """
+        Return the 'resource' of the bot export at path, or None when it is not one (or not the bot named name).
+        """
+        try:
+            with open(path) as definition_file:
+                resource = json.load(definition_file).get('resource')
+        except (OSError, ValueError, AttributeError):
+            return None
+        if not isinstance(resource, dict) or 'name' not in resource or 'intents' not in resource:
+            return None
+        if name is not None and resource['name'] != name:
+            return None
+        return resource
+
+    def stats(self):
+        with self.lock:
+            return dict(
+                self.counts,
+                cached_bots=len(self.bots),
+                cached_bytes=self.total_bytes,
+                aliases=len(self.aliases),
+                indexed_bots=len(self.index or ()),
+                max_bots=self.max_bots,
+                max_bytes=self.max_bytes
+            )
@@ -0,0 +1,385 @@
+"""
+Column-wise validation of reservation batches.
+
+validate_book_car_columns and validate_hotel_columns apply the same rules as validate_book_car and validate_hotel
+in lambda_function to whole columns at once with NumPy masks, and report for every row the first rule it breaks,
+exactly as the per-turn validators would.  Each column is factorized into its distinct values first, so parsing
+dates and numbers and checking vocabularies costs one pass over the distinct values rather than over the rows.
+
+A column can be any sequence of slot values (None or '' for a missing slot), a datetime64 / numeric NumPy array, or a
+(codes, categories) pair of categorical codes where -1 marks a missing value.  Rows holding a value the fast path
+cannot prove equivalent for (a date not written as YYYY-MM-DD, an age such as '17.0', a cell of an object column that
+is neither str nor None such as a datetime.date) are handed to the per-turn validator itself, so the results stay
+identical.  A row that validator cannot read at all (it raises) does not stop the batch: it is reported with the code
+after the last rule, no violated slot and UNREADABLE_ROW as its message, and is marked in the result's 'error' column.
+
+Run from the command line to re-validate an exported CSV whose header uses the slot names:
+    python bulk_validation.py BookCar reservations.csv
+"""
+import csv
+import datetime
+import functools
+import sys
+
+import numpy as np
+
+import lambda_function
+from lambda_function import DEFAULT_VOCABULARY
+
+
+CAR_SLOTS = ('PickUpCity', 'PickUpDate', 'ReturnDate', 'DriverAge', 'CarType')
+HOTEL_SLOTS = ('Location', 'CheckInDate', 'Nights', 'RoomType')
+
+# Rules in the order the per-turn validators test them.  A row's code is the 1-based index of the first rule it
+# breaks, 0 when it is valid.  The messages must stay in step with validate_book_car and validate_hotel.
+CAR_RULES = (
+    ('PickUpCity', 'We currently do not support {} as a valid destination.  Can you try a different city?'),
+    ('PickUpDate', 'I did not understand your departure date.  When would you like to pick up your car rental?'),
+    ('PickUpDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?'),
+    ('ReturnDate', 'I did not understand your return date.  When would you like to return your car rental?'),
+    ('ReturnDate', 'Your return date must be after your pick up date.  Can you try a different return date?'),
+    ('ReturnDate', 'You can reserve a car for up to thirty days.  Can you try a different return date?'),
+    ('DriverAge', 'Your driver must be at least eighteen to rent a car.  Can you provide the age of a different driver?'),
+    ('CarType', 'I did not recognize that model.  What type of car would you like to rent?  '
+                'Popular cars are economy, midsize, or luxury'),
+)
+
+HOTEL_RULES = (
+    ('Location', 'We currently do not support {} as a valid destination.  Can you try a city closer to home?'),
+    ('CheckInDate', 'I did not understand your check in date.  When would you like to check in?'),
+    ('CheckInDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?'),
+    ('Nights', 'You can make a reservations from one to thirty nights.  How many nights would you like to stay for?'),
+    ('RoomType', 'I did not recognize that room type.  Would you like to stay in a queen, king, or deluxe room?'),
+)
+
+# Message for rows the per-turn validator raises on.  Their code is len(rules) + 1.
+UNREADABLE_ROW = 'This row could not be validated: {}'
+
+
+# --- Column factorization ---
+
+
+def _foreign(cells):
+    """
+    Mark cells that are neither str nor None.  Their str() (a datetime.date prints as YYYY-MM-DD) says nothing about
+    how the per-turn validator treats them, so their rows are handed to it.
+    """
+    return np.fromiter((cell is not None and not isinstance(cell, str) for cell in cells), dtype=bool, count=len(cells))
+
+
+def _factorize(values):
+    """
+    Split a column into (codes, categories, missing, foreign) where categories is a str array, missing marks None
+    cells and foreign marks cells of an object column that are neither str nor None.
+    """
+    if isinstance(values, tuple):
+        codes, categories = values
+        codes = np.asarray(codes, dtype=np.intp)
+        missing = codes < 0
+        foreign = np.append(_foreign(categories), False)
+        categories = np.asarray([c if c is not None else '' for c in categories] + [''], dtype=str)
+        codes = np.where(missing, len(categories) - 1, codes)
+        return codes, categories, missing, foreign[codes]
+
+    column = np.asarray(values)
+    foreign = np.zeros(len(column), dtype=bool)
+    if column.dtype.kind == 'M':
+        missing = np.isnat(column)
+        column = np.where(missing, '', np.datetime_as_string(column.astype('datetime64[D]')))
+    elif column.dtype.kind in 'iuf':
+        missing = np.isnan(column) if column.dtype.kind == 'f' else np.zeros(len(column), dtype=bool)
+        column = column.astype(object)
+        column[missing] = ''
+    else:
+        column = np.array(values, dtype=object)
+        missing = np.equal(column, None)
+        foreign = _foreign(column)
+        column[missing] = ''
+    categories, codes = np.unique(column.astype(str), return_inverse=True)
+    return codes.reshape(-1), categories, missing, foreign
+
+
+def _vocabulary_column(values, vocabulary):
+    """
+    Return (present, known, codes, categories, irregular) for a free-text slot checked against vocabulary.
+    irregular marks values that are not text; the per-turn validator decides those rows.
+    """
+    codes, categories, missing, foreign = _factorize(values)
+    present = np.char.str_len(categories) > 0
+    known = np.isin(np.char.lower(categories), np.array(sorted(vocabulary)))
+    return present[codes] & ~missing, known[codes], codes, categories, foreign
+
+
+def _date_column(values):
+    """
+    Return (present, days, irregular) for a date slot.
+
+    days holds the parsed date for every canonical YYYY-MM-DD value and NaT elsewhere.  irregular marks present values
+    that are not canonical date strings; the per-turn validator decides those rows.
+    """
+    codes, categories, missing, foreign = _factorize(values)
+    present = np.char.str_len(categories) > 0
+    canonical = np.char.str_len(categories) == 10
+    if len(categories):
+        chars = categories.astype('<U10').view('<U1').reshape(len(categories), 10)
+        digits = np.char.isdigit(chars)
+        canonical &= digits[:, [0, 1, 2, 3, 5, 6, 8, 9]].all(axis=1)
+        canonical &= (chars[:, 4] == '-') & (chars[:, 7] == '-')
+    days = np.full(len(categories), np.datetime64('NaT'), dtype='datetime64[D]')
+    try:
+        days[canonical] = categories[canonical].astype('datetime64[D]')
+    except ValueError:
+        for index in np.flatnonzero(canonical):
+            try:
+                days[index] = np.datetime64(categories[index], 'D')
+            except ValueError:
+                canonical[index] = False
+    # Year 0 parses in NumPy but not in dateutil.
+    canonical &= days >= np.datetime64('0001-01-01')
+    days[~canonical] = np.datetime64('NaT')
+    return present[codes] & ~missing, days[codes], (present & ~canonical)[codes] & ~missing | foreign
+
+
+def _int_column(values):
+    """
+    Return (present, numbers, irregular) for a slot the per-turn validator reads with safe_int.
+    """
+    column = values if isinstance(values, tuple) else np.asarray(values)
+    if not isinstance(column, tuple) and column.dtype.kind in 'iu':
+        return np.ones(len(column), dtype=bool), column.astype(np.int64), np.zeros(len(column), dtype=bool)
+    if not isinstance(column, tuple) and column.dtype.kind == 'f':
+        present = ~np.isnan(column)
+        finite = np.isfinite(column)
+        return present, np.where(finite, column, 0).astype(np.int64), present & ~finite
+
+    codes, categories, missing, foreign = _factorize(values)
+    regular = np.char.isdigit(categories)
+    numbers = np.zeros(len(categories), dtype=np.int64)
+    try:
+        numbers[regular] = categories[regular].astype(np.int64)
+    except (ValueError, OverflowError):
+        for index in np.flatnonzero(regular):
+            try:
+                numbers[index] = int(categories[index])
+            except (ValueError, OverflowError):
+                regular[index] = False
+    return ~missing, numbers[codes], ~regular[codes] & ~missing | foreign
+
+
+# --- Rule evaluation ---
+
+
+def _first_violation(masks):
+    """
+    Return, per row, the 1-based index of the first True mask, or 0 when none is.
+    """
+    codes = np.zeros(len(masks[0]), dtype=np.int8)
+    for code in range(len(masks), 0, -1):
+        codes[masks[code - 1]] = code
+    return codes
+
+
+def _row_slots(columns, slot_names, row):
+    slots = {}
+    for name in slot_names:
+        values = columns.get(name)
+        if values is None:
+            slots[name] = None
+            continue
+        if isinstance(values, tuple):
+            code = values[0][row]
+            slots[name] = values[1][code] if code >= 0 else None
+            continue
+        value = values[row]
+        if isinstance(value, np.datetime64):
+            value = None if np.isnat(value) else str(value.astype('datetime64[D]'))
+        elif isinstance(value, np.floating) and np.isnan(value):
+            value = None
+        elif isinstance(value, np.generic):
+            value = value.item()
+        slots[name] = value
+    return slots
+
+
+def _build_result(codes, rules, city_rows, city_categories, fallback, columns, slot_names, validator):
+    violated_slots = np.array([None] + [slot for slot, _ in rules], dtype=object)
+    messages = np.array([None] + [message for _, message in rules], dtype=object)
+    violated_slot = violated_slots[codes]
+    message = messages[codes]
+
+    # Only the unsupported-city message carries the slot value.
+    for row in np.flatnonzero(codes == 1):
+        message[row] = rules[0][1].format(city_categories[city_rows[row]])
+
+    rule_codes = {(slot, text): index + 1 for index, (slot, text) in enumerate(rules)}
+    error = np.zeros(len(codes), dtype=bool)
+    for row in np.flatnonzero(fallback):
+        try:
+            validation_result = validator(_row_slots(columns, slot_names, row))
+        except (ValueError, TypeError, AttributeError, OverflowError) as e:
+            codes[row] = len(rules) + 1
+            error[row] = True
+            violated_slot[row] = None
+            message[row] = UNREADABLE_ROW.format(e)
+            continue
+        if validation_result['isValid']:
+            codes[row] = 0
+            violated_slot[row] = None
+            message[row] = None
+            continue
+        slot = validation_result['violatedSlot']
+        text = validation_result['message']['content']
+        codes[row] = rule_codes.get((slot, text), 1)
+        violated_slot[row] = slot
+        message[row] = text
+
+    return {
+        'isValid': codes == 0,
+        'code': codes,
+        'violatedSlot': violated_slot,
+        'message': message,
+        'error': error
+    }
+
+
+def _column(columns, name, length):
+    values = columns.get(name)
+    if values is None:
+        return [None] * length
+    return values
+
+
+def _length(columns):
+    for values in columns.values():
+        return len(values[0]) if isinstance(values, tuple) else len(values)
+    return 0
+
+
+def validate_book_car_columns(columns, today=None, vocabulary=DEFAULT_VOCABULARY):
+    """
+    Validate car rentals given as a mapping of slot name to column.  Missing columns count as unfilled slots.
+
+    today defaults to datetime.date.today(), which is what validate_book_car compares against.  vocabulary is a
+    compiled bot's vocabulary (see bot_registry) when the rows belong to a bot with custom slot types.
+    """
+    today = np.datetime64(today or datetime.date.today(), 'D')
+    length = _length(columns)
+
+    city_present, city_known, city_rows, city_categories, city_irregular = _vocabulary_column(
+        _column(columns, 'PickUpCity', length), vocabulary['cities']
+    )
+    pickup_present, pickup, pickup_irregular = _date_column(_column(columns, 'PickUpDate', length))
+    return_present, return_, return_irregular = _date_column(_column(columns, 'ReturnDate', length))
+    age_present, age, age_irregular = _int_column(_column(columns, 'DriverAge', length))
+    car_present, car_known, _, _, car_irregular = _vocabulary_column(
+        _column(columns, 'CarType', length), vocabulary['car_types']
+    )
+
+    pickup_parsed = ~np.isnat(pickup)
+    return_parsed = ~np.isnat(return_)
+    both = pickup_parsed & return_parsed
+    codes = _first_violation((
+        city_present & ~city_known,
+        pickup_present & ~pickup_parsed,
+        pickup_parsed & (pickup <= today),
+        return_present & ~return_parsed,
+        both & (pickup >= return_),
+        both & ((return_ - pickup).astype(np.int64) > 30),
+        age_present & (age < 18),
+        car_present & ~car_known,
+    ))
+    fallback = city_irregular | pickup_irregular | return_irregular | age_irregular | car_irregular
+    return _build_result(
+        codes, CAR_RULES, city_rows, city_categories, fallback, columns, CAR_SLOTS,
+        functools.partial(lambda_function.validate_book_car, vocabulary=vocabulary)
+    )
+
+
+def validate_hotel_columns(columns, today=None, vocabulary=DEFAULT_VOCABULARY):
+    """
+    Validate hotel stays given as a mapping of slot name to column.  Missing columns count as unfilled slots.
+
+    today defaults to datetime.date.today(), which is what validate_hotel compares against.  vocabulary is a
+    compiled bot's vocabulary (see bot_registry) when the rows belong to a bot with custom slot types.
+    """
+    today = np.datetime64(today or datetime.date.today(), 'D')
+    length = _length(columns)
+
+    location_present, location_known, location_rows, location_categories, location_irregular = _vocabulary_column(
+        _column(columns, 'Location', length), vocabulary['cities']
+    )
+    checkin_present, checkin, checkin_irregular = _date_column(_column(columns, 'CheckInDate', length))
+    nights_present, nights, nights_irregular = _int_column(_column(columns, 'Nights', length))
+    room_present, room_known, _, _, room_irregular = _vocabulary_column(
+        _column(columns, 'RoomType', length), vocabulary['room_types']
+    )
+
+    checkin_parsed = ~np.isnat(checkin)
+    codes = _first_violation((
+        location_present & ~location_known,
+        checkin_present & ~checkin_parsed,
+        checkin_parsed & (checkin <= today),
+        nights_present & ((nights < 1) | (nights > 30)),
+        room_present & ~room_known,
+    ))
+    fallback = location_irregular | checkin_irregular | nights_irregular | room_irregular
+    return _build_result(
+        codes, HOTEL_RULES, location_rows, location_categories, fallback, columns, HOTEL_SLOTS,
+        functools.partial(lambda_function.validate_hotel, vocabulary=vocabulary)
+    )
+
+
+def to_validation_results(result):
+    """
+    Yield one dict per row in the shape returned by the per-turn validators.
+    """
+    for is_valid, violated_slot, message in zip(result['isValid'], result['violatedSlot'], result['message']):
+        if is_valid:
+            yield {'isValid': True}
+        else:
+            yield lambda_function.build_validation_result(False, violated_slot, message)
+
+
+# --- CSV input ---
+
+
+COLUMN_VALIDATORS = {
+    'BookCar': (CAR_SLOTS, validate_book_car_columns),
+    'BookHotel': (HOTEL_SLOTS, validate_hotel_columns),
+}
+
+
+def read_columns(csvfile, slot_names):
+    """
+    Read the named slot columns from a CSV file object with a header row.  Empty cells become None.
+    """
+    reader = csv.DictReader(csvfile)
+    columns = {name: [] for name in slot_names if name in (reader.fieldnames or ())}
+    for row in reader:
+        for name, values in columns.items():
+            values.append(row[name] or None)
+    return columns
+
+
+def validate_csv(path, intent_name, today=None):
+    slot_names, validator = COLUMN_VALIDATORS[intent_name]
+    with open(path, newline='') as csvfile:
+        columns = read_columns(csvfile, slot_names)
+    return validator(columns, today)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2 or argv[0] not in COLUMN_VALIDATORS:
+        sys.stderr.write('usage: bulk_validation.py {} reservations.csv\n'.format('|'.join(COLUMN_VALIDATORS)))
+        return 2
+    result = validate_csv(argv[1], argv[0])
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['row', 'code', 'violatedSlot', 'message'])
+    for row in np.flatnonzero(~result['isValid']):
+        writer.writerow([row, result['code'][row], result['violatedSlot'][row], result['message'][row]])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,350 @@
+"""
+Synthetic Lex V1 event corpus generated from the bot export.
+
+generate() reads the intents and slots of a bot export such as 'BookTripTestTwo_Export 2.json' and streams Lex V1
+code hook events as NDJSON, one event per line.  Slot values are drawn from DEFAULT_DISTRIBUTION, which mixes valid and
+invalid cities and vocabulary, dates on either side of today, driver ages around 18, spans around 30 days/nights,
+missing slots and every confirmation status.  The same seed, distribution and today always produce the same file.
+
+EventCorpus memory-maps a generated file for replay: events are located through an offset index and handed out as
+memoryview slices of the mapping, so the corpus is never read into memory as a whole.
+
+    python event_corpus.py generate --count 1000000 --seed 7 -o events.ndjson
+    python event_corpus.py generate --intent BookCar --intent BookHotel -o supported.ndjson
+    python event_corpus.py replay events.ndjson
+"""
+import argparse
+import datetime
+import json
+import logging
+import mmap
+import os
+import random
+import sys
+import time
+from array import array
+from collections import Counter
+
+from lambda_function import CAR_TYPES, CABIN_TYPES, ROOM_TYPES, VALID_CITIES
+
+
+DEFAULT_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'BookTripTestTwo_Export 2.json')
+
+# Probabilities are per slot or per event; the *_boundary entries are the share of values drawn right at a
+# validation boundary instead of from the comfortable middle of the range.  Events that are neither
+# confirmation_none nor confirmation_confirmed are Denied.
+DEFAULT_DISTRIBUTION = {
+    'missing_slot': 0.25,
+    'invalid_city': 0.2,
+    'invalid_vocabulary': 0.15,
+    'date_boundary': 0.3,
+    'age_boundary': 0.4,
+    'span_boundary': 0.3,
+    'nights_boundary': 0.3,
+    'confirmation_none': 0.6,
+    'confirmation_confirmed': 0.25,
+    'fulfillment': 0.1,
+    'auto_populate': 0.1,
+    'users': 10000,
+}
+
+INVALID_CITIES = ('atlantis', 'gotham', 'springfield', 'london', 'tokyo', 'paris', '12345')
+INVALID_VOCABULARY = ('tank', 'spaceship', 'penthouse', 'bunk', 'cargo', 'n/a')
+COUNTRIES = ('america', 'australia')
+INVALID_COUNTRIES = ('narnia', 'france', 'japan')
+YES_NO = ('yes', 'no')
+
+# Sorted once so that the same seed always picks the same values.
+_CITIES = tuple(sorted(VALID_CITIES))
+_CAR_TYPES = tuple(sorted(CAR_TYPES))
+_CABIN_TYPES = tuple(sorted(CABIN_TYPES))
+_ROOM_TYPES = tuple(sorted(ROOM_TYPES))
+
+_WHITESPACE = b' \t\r'
+
+
+def load_schema(path=DEFAULT_SCHEMA):
+    """
+    Return the bot name, version and [(intent name, [(slot name, slot type), ...]), ...] from a bot export.
+    """
+    with open(path) as schema_file:
+        resource = json.load(schema_file)['resource']
+    intents = [
+        (intent['name'], [(slot['name'], slot.get('slotType', '')) for slot in intent.get('slots', [])])
+        for intent in resource['intents']
+    ]
+    return resource['name'], resource.get('version', '$LATEST'), intents
+
+
+class EventGenerator:
+    """
+    Draws events for a loaded schema from one seeded random stream.
+    """
+
+    def __init__(self, schema, seed=0, distribution=None, today=None, intents=None):
+        self.bot_name, self.bot_version, self.intents = schema
+        if intents is not None:
+            unknown = set(intents).difference(name for name, _ in self.intents)
+            if unknown:
+                raise ValueError('Unknown intents {}; the schema has {}'.format(
+                    ', '.join(sorted(unknown)), ', '.join(name for name, _ in self.intents)
+                ))
+            self.intents = [intent for intent in self.intents if intent[0] in intents]
+        self.random = random.Random(seed)
+        self.distribution = dict(DEFAULT_DISTRIBUTION, **(distribution or {}))
+        self.today = today or datetime.date.today()
+
+    def chance(self, name):
+        return self.random.random() < self.distribution[name]
+
+    def date(self, offset):
+        return (self.today + datetime.timedelta(days=offset)).isoformat()
+
+    def start_offset(self):
+        if self.chance('date_boundary'):
+            return self.random.choice((-2, -1, 0, 1, 2))
+        return self.random.randint(1, 90)
+
+    def span(self):
+        if self.chance('span_boundary'):
+            return self.random.choice((-1, 0, 29, 30, 31))
+        return self.random.randint(1, 28)
+
+    def vocabulary(self, valid):
+        if self.chance('invalid_vocabulary'):
+            return self.random.choice(INVALID_VOCABULARY)
+        return self.random.choice(valid)
+
+    def slot_value(self, slot_name, slot_type, state):
+        """
+        Draw a value for one slot.  state carries the start date so that return dates and spans relate to it.
+        """
+        name = slot_name.lower()
+        if slot_type == 'AMAZON.DATE':
+            if 'return' in name:
+                return self.date(state.setdefault('start', self.start_offset()) + self.span())
+            state['start'] = self.start_offset()
+            return self.date(state['start'])
+        if slot_type == 'AMAZON.NUMBER':
+            if 'age' in name:
+                if self.chance('age_boundary'):
+                    return str(self.random.choice((16, 17, 18, 19)))
+                return str(self.random.randint(18, 85))
+            if 'night' in name:
+                if self.chance('nights_boundary'):
+                    return str(self.random.choice((0, 1, 30, 31)))
+                return str(self.random.randint(1, 14))
+            return str(self.random.randint(1, 6))
+        if 'city' in name or 'location' in name:
+            if self.chance('invalid_city'):
+                return self.random.choice(INVALID_CITIES)
+            return self.random.choice(_CITIES)
+        if 'country' in name:
+            return self.random.choice(INVALID_COUNTRIES if self.chance('invalid_city') else COUNTRIES)
+        if 'car' in name:
+            return self.vocabulary(_CAR_TYPES)
+        if 'cabin' in name:
+            return self.vocabulary(_CABIN_TYPES)
+        if 'room' in name:
+            return self.vocabulary(_ROOM_TYPES)
+        return self.random.choice(YES_NO)
+
+    def confirmation_status(self):
+        draw = self.random.random()
+        if draw < self.distribution['confirmation_none']:
+            return 'None'
+        if draw < self.distribution['confirmation_none'] + self.distribution['confirmation_confirmed']:
+            return 'Confirmed'
+        return 'Denied'
+
+    def session_attributes(self):
+        if not self.chance('auto_populate'):
+            return None
+        return {
+            'confirmationContext': 'AutoPopulate',
+            'lastConfirmedReservation': json.dumps({
+                'ReservationType': 'Car',
+                'Location': self.random.choice(_CITIES),
+                'CheckInDate': self.date(self.start_offset()),
+                'Nights': self.random.randint(1, 14)
+            })
+        }
+
+    def event(self):
+        intent_name, slot_specs = self.random.choice(self.intents)
+        state = {}
+        slots = {}
+        for slot_name, slot_type in slot_specs:
+            value = self.slot_value(slot_name, slot_type, state)
+            slots[slot_name] = None if self.chance('missing_slot') else value
+        return {
+            'messageVersion': '1.0',
+            'invocationSource': 'FulfillmentCodeHook' if self.chance('fulfillment') else 'DialogCodeHook',
+            'userId': 'synthetic-{}'.format(self.random.randrange(int(self.distribution['users']))),
+            'sessionAttributes': self.session_attributes(),
+            'requestAttributes': None,
+            'bot': {'name': self.bot_name, 'alias': '$LATEST', 'version': self.bot_version},
+            'outputDialogMode': 'Text',
+            'currentIntent': {
+                'name': intent_name,
+                'slots': slots,
+                'confirmationStatus': self.confirmation_status()
+            },
+            'inputTranscript': ''
+        }
+
+
+def generate(output, count, seed=0, distribution=None, schema_path=DEFAULT_SCHEMA, today=None, intents=None):
+    """
+    Write count events to the binary file object output, one JSON document per line.  intents limits the events to
+    those intent names; by default every intent in the schema is drawn.
+    """
+    generator = EventGenerator(load_schema(schema_path), seed, distribution, today, intents)
+    encode = json.JSONEncoder(separators=(',', ':')).encode
+    for _ in range(count):
+        output.write(encode(generator.event()).encode('utf-8'))
+        output.write(b'\n')
+
+
+class EventCorpus:
+    """
+    Read-only, memory-mapped view of a generated NDJSON corpus.  Blank lines are skipped.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.view = memoryview(self.map) if self.map is not None else memoryview(b'')
+        # Start and end (exclusive, before the newline) of every non-blank line.
+        self.starts = array('Q')
+        self.ends = array('Q')
+        position = 0
+        while position < size:
+            end = self.map.find(b'\n', position)
+            if end < 0:
+                end = size
+            # Only lines that start with whitespace are copied to check whether they are blank.
+            if end > position and not (self.map[position] in _WHITESPACE and self.map[position:end].isspace()):
+                self.starts.append(position)
+                self.ends.append(end)
+            position = end + 1
+
+    def __len__(self):
+        return len(self.starts)
+
+    def raw(self, index):
+        """
+        The encoded event as a memoryview into the mapping, without copying it.
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('event index out of range')
+        return self.view[self.starts[index]:self.ends[index]]
+
+    def __getitem__(self, index):
+        return json.loads(self.raw(index).tobytes())
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def close(self):
+        self.view.release()
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _is_unsupported_intent(error, event):
+    """
+    Whether error is the bare Exception lambda_function.dispatch raises for an intent the bot has no handler for.
+    """
+    intent_name = (event.get('currentIntent') or {}).get('name')
+    return type(error) is Exception and str(error) == 'Intent with name {} not supported'.format(intent_name)
+
+
+def replay(path, handler):
+    """
+    Run every event of a corpus through handler.  Returns counts per dialog action type and exception, and the rate.
+
+    Events for intents the handler does not support are counted as UnsupportedIntent, and per intent under
+    unsupported_intents, so that they do not hide other exceptions.
+    """
+    outcomes = Counter()
+    unsupported = Counter()
+    with EventCorpus(path) as corpus:
+        started = time.perf_counter()
+        for event in corpus:
+            try:
+                outcomes[handler(event, None)['dialogAction']['type']] += 1
+            except Exception as e:
+                if _is_unsupported_intent(e, event):
+                    outcomes['UnsupportedIntent'] += 1
+                    unsupported[event['currentIntent']['name']] += 1
+                else:
+                    outcomes[type(e).__name__] += 1
+        elapsed = time.perf_counter() - started
+        return {'events': len(corpus), 'seconds': elapsed, 'events_per_second': len(corpus) / elapsed if elapsed else 0,
+                'outcomes': dict(outcomes), 'unsupported_intents': dict(unsupported)}
+
+
+def _distribution_override(text):
+    key, _, value = text.partition('=')
+    if key not in DEFAULT_DISTRIBUTION or not value:
+        raise argparse.ArgumentTypeError('expected one of {} as key=value'.format(', '.join(DEFAULT_DISTRIBUTION)))
+    return key, float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate or replay a synthetic Lex event corpus.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser('generate', help='write a corpus as NDJSON')
+    generate_parser.add_argument('--count', type=int, default=100000)
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.add_argument('--schema', default=DEFAULT_SCHEMA, help='bot export JSON')
+    generate_parser.add_argument('--today', type=datetime.date.fromisoformat, default=None,
+                                 help='date the offsets are relative to (YYYY-MM-DD); defaults to today')
+    generate_parser.add_argument('--set', dest='overrides', type=_distribution_override, action='append', default=[],
+                                 metavar='KEY=VALUE', help='override a DEFAULT_DISTRIBUTION entry')
+    generate_parser.add_argument('--intent', dest='intents', action='append', metavar='NAME',
+                                 help='only draw this intent (repeatable); defaults to every intent in the schema')
+    generate_parser.add_argument('-o', '--output', help='file to write to instead of stdout')
+
+    replay_parser = commands.add_parser('replay', help='run a corpus through lambda_handler')
+    replay_parser.add_argument('path')
+    replay_parser.add_argument('--admission', action='store_true',
+                               help='keep admission control on; by default it is off so every event is dispatched')
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            generate(output, args.count, args.seed, dict(args.overrides), args.schema, args.today, args.intents)
+        except ValueError as e:
+            parser.error(str(e))
+        finally:
+            if args.output:
+                output.close()
+        return 0
+
+    logging.disable(logging.CRITICAL)
+    import admission
+    import lambda_function
+    if not args.admission:
+        admission.configure(rate=0)
+    json.dump(replay(args.path, lambda_function.lambda_handler), sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
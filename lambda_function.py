@@ -5,6 +5,11 @@ import os
 import dateutil.parser
 import logging
 
+import admission
+import bot_registry
+from lex_responses import plain_text, RESERVATION_PLACED, HOTEL_RESERVATION_PLACED, ASK_DESTINATION, ASK_GUESTS, \
+    ASK_CAR_CITY, ASK_DRIVER_AGE, ASK_CAR_TYPE
+
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
@@ -84,30 +89,42 @@ def try_ex(func):
         return func()
     except KeyError:
         return None
-    
-def isvalid_car_type(car_type):
-    car_types = ['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury']
+
+
+# Vocabularies accepted by the validators below.  bulk_validation evaluates the same sets column-wise.
+CAR_TYPES = frozenset(['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury'])
+CABIN_TYPES = frozenset(['economy', 'business', 'first'])
+VALID_CITIES = frozenset(['new york', 'los angeles', 'chicago', 'houston', 'philadelphia', 'phoenix', 'san antonio',
+                          'san diego', 'dallas', 'san jose', 'austin', 'jacksonville', 'san francisco', 'indianapolis',
+                          'columbus', 'fort worth', 'charlotte', 'detroit', 'el paso', 'seattle', 'denver',
+                          'washington dc', 'memphis', 'boston', 'nashville', 'baltimore', 'portland', 'sydney',
+                          'melbourne', 'hobart', 'brisbane', 'darwin', 'perth', 'canberra', 'adelaide'])
+ROOM_TYPES = frozenset(['queen', 'king', 'deluxe'])
+
+# Bots compiled from a definition with custom slot types get their own vocabulary in this shape; see bot_registry.
+DEFAULT_VOCABULARY = {
+    'cities': VALID_CITIES,
+    'car_types': CAR_TYPES,
+    'cabin_types': CABIN_TYPES,
+    'room_types': ROOM_TYPES
+}
+
+
+def isvalid_car_type(car_type, car_types=CAR_TYPES):
     return car_type.lower() in car_types
 
-def isvalid_cabin_type(cabin_type):
-    cabin_types = ['economy', 'business', 'first']
+def isvalid_cabin_type(cabin_type, cabin_types=CABIN_TYPES):
     return cabin_type.lower() in cabin_types
 
 def isvalid_country(country):
     valid_countries = ['America', 'Australia']
     return city.lower() in valid_countries
 
-def isvalid_city(city):
-    valid_cities = ['new york', 'los angeles', 'chicago', 'houston', 'philadelphia', 'phoenix', 'san antonio',
-                    'san diego', 'dallas', 'san jose', 'austin', 'jacksonville', 'san francisco', 'indianapolis',
-                    'columbus', 'fort worth', 'charlotte', 'detroit', 'el paso', 'seattle', 'denver', 'washington dc',
-                    'memphis', 'boston', 'nashville', 'baltimore', 'portland', 'sydney', 'melbourne', 'hobart', 
-                    'brisbane', 'darwin', 'perth', 'canberra', 'adelaide']
-    return city.lower() in valid_cities
+def isvalid_city(city, cities=VALID_CITIES):
+    return city.lower() in cities
 
 
-def isvalid_room_type(room_type):
-    room_types = ['queen', 'king', 'deluxe']
+def isvalid_room_type(room_type, room_types=ROOM_TYPES):
     return room_type.lower() in room_types
 
 
@@ -135,10 +152,10 @@ def build_validation_result(isvalid, violated_slot, message_content):
     return {
         'isValid': isvalid,
         'violatedSlot': violated_slot,
-        'message': {'contentType': 'PlainText', 'content': message_content}
+        'message': plain_text(message_content)
     }
 
-def validate_book_flight(slots):
+def validate_book_flight(slots, vocabulary=DEFAULT_VOCABULARY):
     arrival_country = try_ex(lambda: slots['ArrivalCountry'])
     arrival_city = try_ex(lambda: slots['ArrivalCity'])
     leave_date = try_ex(lambda: slots['LeaveDate'])
@@ -153,7 +170,7 @@ def validate_book_flight(slots):
             'We currently do not support {} as a valid destination. Can you try the country you are currently in?'.format(arrival_country)
             )
     
-    if arrival_city and not isvalid_city(arrival_city):
+    if arrival_city and not isvalid_city(arrival_city, vocabulary['cities']):
         return build_validation_result(
             False,
             'ArrivalCity',
@@ -167,7 +184,7 @@ def validate_book_flight(slots):
         if dateutil.parser.parse(leave_date) >= dateutil.parser.parse(return_date):
             return build_validation_result(False, 'ReturnDate', 'Your return date must be after your arrival date. Can you try a different return date?')
             
-    if cabin_type and not isvalid_cabin_type(cabin_type):
+    if cabin_type and not isvalid_cabin_type(cabin_type, vocabulary['cabin_types']):
         return build_validation_result(
             False,
             'CabinType',
@@ -177,14 +194,14 @@ def validate_book_flight(slots):
     return {'isValid': True}
 
 
-def validate_book_car(slots):
+def validate_book_car(slots, vocabulary=DEFAULT_VOCABULARY):
     pickup_city = try_ex(lambda: slots['PickUpCity'])
     pickup_date = try_ex(lambda: slots['PickUpDate'])
     return_date = try_ex(lambda: slots['ReturnDate'])
     driver_age = safe_int(try_ex(lambda: slots['DriverAge']))
     car_type = try_ex(lambda: slots['CarType'])
 
-    if pickup_city and not isvalid_city(pickup_city):
+    if pickup_city and not isvalid_city(pickup_city, vocabulary['cities']):
         return build_validation_result(
             False,
             'PickUpCity',
@@ -215,7 +232,7 @@ def validate_book_car(slots):
             'Your driver must be at least eighteen to rent a car.  Can you provide the age of a different driver?'
         )
 
-    if car_type and not isvalid_car_type(car_type):
+    if car_type and not isvalid_car_type(car_type, vocabulary['car_types']):
         return build_validation_result(
             False,
             'CarType',
@@ -225,13 +242,13 @@ def validate_book_car(slots):
     return {'isValid': True}
 
 
-def validate_hotel(slots):
+def validate_hotel(slots, vocabulary=DEFAULT_VOCABULARY):
     location = try_ex(lambda: slots['Location'])
     checkin_date = try_ex(lambda: slots['CheckInDate'])
     nights = safe_int(try_ex(lambda: slots['Nights']))
     room_type = try_ex(lambda: slots['RoomType'])
 
-    if location and not isvalid_city(location):
+    if location and not isvalid_city(location, vocabulary['cities']):
         return build_validation_result(
             False,
             'Location',
@@ -251,7 +268,7 @@ def validate_hotel(slots):
             'You can make a reservations from one to thirty nights.  How many nights would you like to stay for?'
         )
 
-    if room_type and not isvalid_room_type(room_type):
+    if room_type and not isvalid_room_type(room_type, vocabulary['room_types']):
         return build_validation_result(False, 'RoomType', 'I did not recognize that room type.  Would you like to stay in a queen, king, or deluxe room?')
 
     return {'isValid': True}
@@ -260,7 +277,7 @@ def validate_hotel(slots):
 """ --- Functions that control the bot's behavior --- """
 
 
-def book_hotel(intent_request):
+def book_hotel(intent_request, vocabulary=DEFAULT_VOCABULARY):
     """
     Performs dialog management and fulfillment for booking a hotel.
 
@@ -290,8 +307,11 @@ def book_hotel(intent_request):
 
     if intent_request['invocationSource'] == 'DialogCodeHook':
         # Validate any slots which have been specified.  If any are invalid, re-elicit for their value
-        validation_result = validate_hotel(intent_request['currentIntent']['slots'])
+        validation_result = validate_hotel(intent_request['currentIntent']['slots'], vocabulary)
         if not validation_result['isValid']:
+            logger.debug('validationFailed intentName={}, slot={}'.format(
+                intent_request['currentIntent']['name'], validation_result['violatedSlot']
+            ))
             slots[validation_result['violatedSlot']] = None
 
             return elicit_slot(
@@ -318,15 +338,11 @@ def book_hotel(intent_request):
     return close(
         session_attributes,
         'Fulfilled',
-        {
-            'contentType': 'PlainText',
-            'content': 'Thanks, I have placed your reservation.   Please let me know if you would like to book a car '
-                       'rental, or another hotel.'
-        }
+        HOTEL_RESERVATION_PLACED
     )
 
 
-def book_flight(intent_request):
+def book_flight(intent_request, vocabulary=DEFAULT_VOCABULARY):
     
     """
     Performs dialog management and fulfillment for booking a flight.
@@ -364,8 +380,11 @@ def book_flight(intent_request):
 
     if intent_request['invocationSource'] == 'DialogCodeHook':
         # Validate any slots which have been specified.  If any are invalid, re-elicit for their value
-        validation_result = validate_book_flight(intent_request['currentIntent']['slots'])
+        validation_result = validate_book_flight(intent_request['currentIntent']['slots'], vocabulary)
         if not validation_result['isValid']:
+            logger.debug('validationFailed intentName={}, slot={}'.format(
+                intent_request['currentIntent']['name'], validation_result['violatedSlot']
+            ))
             slots[validation_result['violatedSlot']] = None
             return elicit_slot(
                 session_attributes,
@@ -394,11 +413,7 @@ def book_flight(intent_request):
                     'Amount': None
                 },
                 'ArrivalCountry',
-                {
-                    'contentType': 'PlainText',
-                    'content': 'Where would you like to travel to?'
-                }
-                
+                ASK_DESTINATION
             )
             
         return delegate(session_attributes, intent_request['currentIntent']['slots'])
@@ -419,10 +434,7 @@ def book_flight(intent_request):
                     intent_request['currentIntent']['name'],
                     intent_request['currentIntent']['slots'],
                     'Amount',
-                    {
-                        'contentType': 'PlainText',
-                        'content': 'How many guests?'
-                    }
+                    ASK_GUESTS
                 )
 
     return delegate(session_attributes, intent_request['currentIntent']['slots'])
@@ -434,13 +446,10 @@ def book_flight(intent_request):
     return close(
         session_attributes,
         'Fulfilled',
-        {
-            'contentType': 'PlainText',
-            'content': 'Thanks, I have placed your reservation.'
-        }
+        RESERVATION_PLACED
     )
 
-def book_car(intent_request):
+def book_car(intent_request, vocabulary=DEFAULT_VOCABULARY):
     
     """
     Performs dialog management and fulfillment for booking a car.
@@ -474,8 +483,11 @@ def book_car(intent_request):
 
     if intent_request['invocationSource'] == 'DialogCodeHook':
         # Validate any slots which have been specified.  If any are invalid, re-elicit for their value
-        validation_result = validate_book_car(intent_request['currentIntent']['slots'])
+        validation_result = validate_book_car(intent_request['currentIntent']['slots'], vocabulary)
         if not validation_result['isValid']:
+            logger.debug('validationFailed intentName={}, slot={}'.format(
+                intent_request['currentIntent']['name'], validation_result['violatedSlot']
+            ))
             slots[validation_result['violatedSlot']] = None
             return elicit_slot(
                 session_attributes,
@@ -503,10 +515,7 @@ def book_car(intent_request):
                         'CarType': None
                     },
                     'PickUpCity',
-                    {
-                        'contentType': 'PlainText',
-                        'content': 'Where would you like to make your car reservation?'
-                    }
+                    ASK_CAR_CITY
                 )
 
             return delegate(session_attributes, intent_request['currentIntent']['slots'])
@@ -555,10 +564,7 @@ def book_car(intent_request):
                         intent_request['currentIntent']['name'],
                         intent_request['currentIntent']['slots'],
                         'DriverAge',
-                        {
-                            'contentType': 'PlainText',
-                            'content': 'How old is the driver of this car rental?'
-                        }
+                        ASK_DRIVER_AGE
                     )
                 elif not car_type:
                     return elicit_slot(
@@ -566,11 +572,7 @@ def book_car(intent_request):
                         intent_request['currentIntent']['name'],
                         intent_request['currentIntent']['slots'],
                         'CarType',
-                        {
-                            'contentType': 'PlainText',
-                            'content': 'What type of car would you like? Popular models are '
-                                       'economy, midsize, and luxury.'
-                        }
+                        ASK_CAR_TYPE
                     )
 
             return delegate(session_attributes, intent_request['currentIntent']['slots'])
@@ -582,16 +584,29 @@ def book_car(intent_request):
     return close(
         session_attributes,
         'Fulfilled',
-        {
-            'contentType': 'PlainText',
-            'content': 'Thanks, I have placed your reservation.'
-        }
+        RESERVATION_PLACED
     )
 
 
 # --- Intents ---
 
 
+INTENT_HANDLERS = {
+    'BookHotel': book_hotel,
+    'BookCar': book_car,
+    'BookFlight': book_flight
+}
+
+# Bot definitions are looked up by event['bot'] in BOT_DEFINITIONS_DIR (by default next to this file).
+bots = bot_registry.BotRegistry(
+    INTENT_HANDLERS,
+    DEFAULT_VOCABULARY,
+    os.environ.get('BOT_DEFINITIONS_DIR', os.path.dirname(os.path.abspath(__file__))),
+    max_bots=int(os.environ.get('BOT_CACHE_MAX_BOTS', 16)),
+    max_bytes=int(os.environ.get('BOT_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+)
+
+
 def dispatch(intent_request):
     """
     Called when the user specifies an intent for this bot.
@@ -601,14 +616,11 @@ def dispatch(intent_request):
 
     intent_name = intent_request['currentIntent']['name']
 
-    # Dispatch to your bot's intent handlers
-    if intent_name == 'BookHotel':
-        return book_hotel(intent_request)
-    elif intent_name == 'BookCar':
-        return book_car(intent_request)
-    elif intent_name == 'BookFlight':
-        return book_flight(intent_request)
-    
+    # Dispatch to the intent handlers compiled for this bot
+    handler = bots.get(intent_request.get('bot') or {}).intents.get(intent_name)
+    if handler is not None:
+        return handler(intent_request)
+
     raise Exception('Intent with name ' + intent_name + ' not supported')
 
 
@@ -620,6 +632,10 @@ def lambda_handler(event, context):
     Route the incoming request based on intent.
     The JSON body of the request is provided in the event slot.
     """
+    # Shed users who are over their rate before doing any work for them.
+    if not admission.admit(event):
+        return admission.throttled_response(event)
+
     # By default, treat the user request as coming from the Australia/Sydney time zone.
     os.environ['TZ'] = 'Australia/Sydney'
     time.tzset()
@@ -0,0 +1,222 @@
+import json
+from functools import lru_cache
+from json.encoder import c_make_encoder, encode_basestring
+
+
+# --- Static messages, interned once at import ---
+
+
+class _SharedMessage(dict):
+    """
+    A message object handed to every response that uses its prompt, so changing it in place is refused.
+    Copies (copy.copy, copy.deepcopy, pickle) come back as plain dicts that can be changed freely.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Shared Lex messages are read-only; build a new message with plain_text instead')
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def plain_text(content):
+    """
+    Return the PlainText message object for content.
+
+    Static prompts come back as the shared, read-only object interned below so that no new dict is built per turn.
+    """
+    message = _INTERNED_MESSAGES.get(content)
+    if message is None:
+        message = {'contentType': 'PlainText', 'content': content}
+    return message
+
+
+_STATIC_PROMPTS = (
+    'Thanks, I have placed your reservation.',
+    'Thanks, I have placed your reservation.   Please let me know if you would like to book a car '
+    'rental, or another hotel.',
+    'Where would you like to travel to?',
+    'How many guests?',
+    'Where would you like to make your car reservation?',
+    'How old is the driver of this car rental?',
+    'What type of car would you like? Popular models are economy, midsize, and luxury.',
+    'I did not understand your return date. When would you like to return home?',
+    'Your return date must be after your arrival date. Can you try a different return date?',
+    'I did not recognize that type of seating class.  What class would you like to travel?  '
+    'Popular classes are economy, business, or first class',
+    'I did not understand your departure date.  When would you like to pick up your car rental?',
+    'Reservations must be scheduled at least one day in advance.  Can you try a different date?',
+    'I did not understand your return date.  When would you like to return your car rental?',
+    'Your return date must be after your pick up date.  Can you try a different return date?',
+    'You can reserve a car for up to thirty days.  Can you try a different return date?',
+    'Your driver must be at least eighteen to rent a car.  Can you provide the age of a different driver?',
+    'I did not recognize that model.  What type of car would you like to rent?  '
+    'Popular cars are economy, midsize, or luxury',
+    'I did not understand your check in date.  When would you like to check in?',
+    'You can make a reservations from one to thirty nights.  How many nights would you like to stay for?',
+    'I did not recognize that room type.  Would you like to stay in a queen, king, or deluxe room?',
+    'Sorry, I am receiving too many requests from you right now.  Please try again in a moment.',
+)
+
+_INTERNED_MESSAGES = {
+    content: _SharedMessage(contentType='PlainText', content=content) for content in _STATIC_PROMPTS
+}
+
+RESERVATION_PLACED = plain_text('Thanks, I have placed your reservation.')
+HOTEL_RESERVATION_PLACED = plain_text(
+    'Thanks, I have placed your reservation.   Please let me know if you would like to book a car '
+    'rental, or another hotel.'
+)
+ASK_DESTINATION = plain_text('Where would you like to travel to?')
+ASK_GUESTS = plain_text('How many guests?')
+ASK_CAR_CITY = plain_text('Where would you like to make your car reservation?')
+ASK_DRIVER_AGE = plain_text('How old is the driver of this car rental?')
+ASK_CAR_TYPE = plain_text('What type of car would you like? Popular models are economy, midsize, and luxury.')
+THROTTLED = plain_text('Sorry, I am receiving too many requests from you right now.  Please try again in a moment.')
+
+
+# --- Pre-encoded JSON fragments ---
+
+
+def _unserializable(value):
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+if c_make_encoder is not None:
+    # JSONEncoder.encode builds a new C encoder on every call, which costs as much as encoding a small response.
+    # Building it once makes each fragment about half the price of a json.dumps call.  Responses are plain trees,
+    # so the circular reference check is left out.
+    _iterencode = c_make_encoder(None, _unserializable, encode_basestring, None, ':', ',', False, False, True)
+
+    def _encode(value):
+        return ''.join(_iterencode(value, 0))
+else:
+    _encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+
+_MESSAGE_JSON = {id(message): _encode(message).encode('utf-8') for message in _INTERNED_MESSAGES.values()}
+
+_SESSION_ATTRIBUTES = b'{"sessionAttributes":'
+_ELICIT_SLOT = b',"dialogAction":{"type":"ElicitSlot","intentName":'
+_CONFIRM_INTENT = b',"dialogAction":{"type":"ConfirmIntent","intentName":'
+_CLOSE = b',"dialogAction":{"type":"Close","fulfillmentState":'
+_DELEGATE = b',"dialogAction":{"type":"Delegate","slots":'
+_SLOTS = b',"slots":'
+_SLOT_TO_ELICIT = b',"slotToElicit":'
+_MESSAGE = b',"message":'
+_END = b'}}'
+
+
+@lru_cache(maxsize=256)
+def _encode_name(name):
+    """
+    Encode an intent name, slot name or fulfillment state.  These come from a small fixed set, so they are cached.
+    """
+    return _encode(name).encode('utf-8')
+
+
+def _encode_value(value):
+    return _encode(value).encode('utf-8')
+
+
+# --- Dialog action fragments ---
+#
+# Everything in a dialog action except the slots is fixed for a given intent, slot and static prompt, so the
+# dialogAction is written with its slots last and the part before them is encoded once per combination.  Only
+# interned messages are cached (keyed by id, which is stable because they live as long as the module); any other
+# message is encoded on every call.
+
+
+def _elicit_slot_action(intent_name, slot_to_elicit, message_json):
+    return b''.join((
+        _ELICIT_SLOT, _encode_name(intent_name),
+        _SLOT_TO_ELICIT, _encode_name(slot_to_elicit),
+        _MESSAGE, message_json,
+        _SLOTS
+    ))
+
+
+def _confirm_intent_action(intent_name, message_json):
+    return b''.join((_CONFIRM_INTENT, _encode_name(intent_name), _MESSAGE, message_json, _SLOTS))
+
+
+def _close_action(fulfillment_state, message_json):
+    return b''.join((_CLOSE, _encode_name(fulfillment_state), _MESSAGE, message_json, _END))
+
+
+@lru_cache(maxsize=1024)
+def _interned_elicit_slot_action(intent_name, slot_to_elicit, message_id):
+    return _elicit_slot_action(intent_name, slot_to_elicit, _MESSAGE_JSON[message_id])
+
+
+@lru_cache(maxsize=256)
+def _interned_confirm_intent_action(intent_name, message_id):
+    return _confirm_intent_action(intent_name, _MESSAGE_JSON[message_id])
+
+
+@lru_cache(maxsize=256)
+def _interned_close_action(fulfillment_state, message_id):
+    return _close_action(fulfillment_state, _MESSAGE_JSON[message_id])
+
+
+# --- Byte encoders, one per dialog action ---
+
+
+def encode_elicit_slot(session_attributes, intent_name, slots, slot_to_elicit, message):
+    if id(message) in _MESSAGE_JSON:
+        action = _interned_elicit_slot_action(intent_name, slot_to_elicit, id(message))
+    else:
+        action = _elicit_slot_action(intent_name, slot_to_elicit, _encode_value(message))
+    return b''.join((_SESSION_ATTRIBUTES, _encode_value(session_attributes), action, _encode_value(slots), _END))
+
+
+def encode_confirm_intent(session_attributes, intent_name, slots, message):
+    if id(message) in _MESSAGE_JSON:
+        action = _interned_confirm_intent_action(intent_name, id(message))
+    else:
+        action = _confirm_intent_action(intent_name, _encode_value(message))
+    return b''.join((_SESSION_ATTRIBUTES, _encode_value(session_attributes), action, _encode_value(slots), _END))
+
+
+def encode_close(session_attributes, fulfillment_state, message):
+    if id(message) in _MESSAGE_JSON:
+        action = _interned_close_action(fulfillment_state, id(message))
+    else:
+        action = _close_action(fulfillment_state, _encode_value(message))
+    return b''.join((_SESSION_ATTRIBUTES, _encode_value(session_attributes), action))
+
+
+def encode_delegate(session_attributes, slots):
+    return b''.join((_SESSION_ATTRIBUTES, _encode_value(session_attributes), _DELEGATE, _encode_value(slots), _END))
+
+
+def encode_response(response):
+    """
+    Encode a response dict built by lambda_function (elicit_slot, confirm_intent, close or delegate) to UTF-8 JSON bytes.
+
+    This is the entry point for hosts that write the response body themselves instead of handing the dict
+    back to the Lambda runtime.  Any other shape falls back to a plain compact json encoding.
+    """
+    dialog_action = response.get('dialogAction')
+    action_type = dialog_action.get('type') if dialog_action else None
+    if action_type == 'ElicitSlot':
+        return encode_elicit_slot(
+            response['sessionAttributes'],
+            dialog_action['intentName'],
+            dialog_action['slots'],
+            dialog_action['slotToElicit'],
+            dialog_action['message']
+        )
+    if action_type == 'ConfirmIntent':
+        return encode_confirm_intent(
+            response['sessionAttributes'],
+            dialog_action['intentName'],
+            dialog_action['slots'],
+            dialog_action['message']
+        )
+    if action_type == 'Close':
+        return encode_close(response['sessionAttributes'], dialog_action['fulfillmentState'], dialog_action['message'])
+    if action_type == 'Delegate':
+        return encode_delegate(response['sessionAttributes'], dialog_action['slots'])
+    return _encode_value(response)
@@ -17,7 +17,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic.base import TemplateView
 
+from a_Django_app.views import export, ops_dashboard
+
 urlpatterns = [
+    path('admin/dashboard/', ops_dashboard, name='ops_dashboard'),
+    path('admin/export/<str:dataset>/', export, name='export'),
     path('admin/', admin.site.urls),
     path('accounts/', include('django.contrib.auth.urls')),
     path('', TemplateView.as_view(template_name='home.html'), name='home'),
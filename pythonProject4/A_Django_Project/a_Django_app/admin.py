@@ -1,3 +1,58 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 
-# Register your models here.
+from .models import Invocation, InvocationError, Reservation, IntentRollup, SlotFailureRollup
+
+
+class CappedCountPaginator(Paginator):
+    """
+    Paginator that stops counting at COUNT_LIMIT rows, so a change list page costs a bounded index scan instead of a
+    COUNT(*) over the whole table.  Rows past the limit are reached by searching or filtering.
+    """
+    COUNT_LIMIT = 10000
+
+    @cached_property
+    def count(self):
+        return self.object_list[:self.COUNT_LIMIT].count()
+
+
+# The raw event tables can hold tens of millions of rows, so their change lists never count them in full and have no
+# date hierarchy (it would run Min/Max and DISTINCT date queries over the whole table on every page load).
+
+@admin.register(Invocation)
+class InvocationAdmin(admin.ModelAdmin):
+    list_display = ('request_id', 'started_at', 'intent_name', 'user_id', 'violated_slot', 'duration_ms',
+                    'max_memory_used_mb')
+    search_fields = ('=request_id', '=user_id')
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(InvocationError)
+class InvocationErrorAdmin(admin.ModelAdmin):
+    list_display = ('logged_at', 'request_id', 'error_type')
+    search_fields = ('=request_id',)
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Reservation)
+class ReservationAdmin(admin.ModelAdmin):
+    list_display = ('logged_at', 'reservation_type', 'city', 'start_date', 'user_id')
+    search_fields = ('=request_id', '=city')
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(IntentRollup)
+class IntentRollupAdmin(admin.ModelAdmin):
+    list_display = ('bucket_start', 'granularity', 'intent_name', 'invocations', 'conversations', 'fulfilled',
+                    'validation_failures')
+    list_filter = ('granularity', 'intent_name')
+
+
+@admin.register(SlotFailureRollup)
+class SlotFailureRollupAdmin(admin.ModelAdmin):
+    list_display = ('bucket_start', 'granularity', 'intent_name', 'slot', 'failures')
+    list_filter = ('granularity', 'intent_name', 'slot')
@@ -0,0 +1,147 @@
+import csv
+import datetime
+import io
+import json
+import zlib
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Invocation, Reservation
+
+
+# Exported columns per dataset, and which field each filter applies to (None when it does not apply).
+DATASETS = {
+    'reservations': {
+        'model': Reservation,
+        'fields': ('id', 'request_id', 'user_id', 'intent_name', 'logged_at', 'reservation_type', 'city',
+                   'start_date', 'details'),
+        'date_field': 'logged_at',
+        'city_field': 'city',
+    },
+    'invocations': {
+        'model': Invocation,
+        'fields': ('id', 'request_id', 'started_at', 'version', 'bot_name', 'user_id', 'intent_name',
+                   'violated_slot', 'first_turn', 'duration_ms', 'billed_duration_ms', 'memory_size_mb',
+                   'max_memory_used_mb'),
+        'date_field': 'started_at',
+        'city_field': None,
+    },
+}
+
+FORMATS = ('csv', 'ndjson')
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_bound(value):
+    """
+    Parse a date range bound given as YYYY-MM-DD or an ISO datetime.  Naive values are taken as UTC.
+    """
+    if not value:
+        return None
+    try:
+        # Both return None for text that is not shaped like a date but raise for impossible ones such as 2022-02-30.
+        moment = parse_datetime(value)
+        day = parse_date(value) if moment is None else None
+    except ValueError as e:
+        raise ExportError('Not a date: {} ({})'.format(value, e))
+    if moment is None:
+        if day is None:
+            raise ExportError('Not a date: {}'.format(value))
+        moment = datetime.datetime.combine(day, datetime.time())
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return moment
+
+
+def build_queryset(dataset, start=None, end=None, intent=None, city=None):
+    """
+    Return the filtered queryset and exported field names for dataset.  start is inclusive and end exclusive.
+    """
+    try:
+        spec = DATASETS[dataset]
+    except KeyError:
+        raise ExportError('Unknown dataset {}; choose from {}'.format(dataset, ', '.join(DATASETS)))
+    queryset = spec['model'].objects.all()
+    if start:
+        queryset = queryset.filter(**{spec['date_field'] + '__gte': parse_bound(start)})
+    if end:
+        queryset = queryset.filter(**{spec['date_field'] + '__lt': parse_bound(end)})
+    if intent:
+        queryset = queryset.filter(intent_name=intent)
+    if city:
+        if spec['city_field'] is None:
+            raise ExportError('{} cannot be filtered by city'.format(dataset))
+        queryset = queryset.filter(**{spec['city_field'] + '__iexact': city})
+    return queryset, spec['fields']
+
+
+def iter_rows(queryset, fields, date_field, chunk_size=2000):
+    """
+    Yield pages of value tuples using keyset pagination on (date_field, id).
+
+    Paging in date order lets the same index serve the date range, the intent filter and the ordering, so each page
+    is an index range scan rather than a sort of every remaining row.  Every page is its own short query, so no
+    transaction or server-side cursor stays open between pages and memory is bounded by chunk_size.
+    """
+    queryset = queryset.order_by(date_field, 'id')
+    date_index, id_index = fields.index(date_field), fields.index('id')
+    page = list(queryset.values_list(*fields)[:chunk_size])
+    while page:
+        yield page
+        last_date, last_id = page[-1][date_index], page[-1][id_index]
+        # The redundant >= bound keeps the OR from hiding the range start from the query planner.
+        after = queryset.filter(
+            Q(**{date_field + '__gt': last_date}) | Q(**{date_field: last_date, 'id__gt': last_id}),
+            **{date_field + '__gte': last_date}
+        )
+        page = list(after.values_list(*fields)[:chunk_size])
+
+
+def _text(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+def iter_csv(pages, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for page in pages:
+        writer.writerows([[_text(value) for value in row] for row in page])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson(pages, fields):
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_text).encode
+    for page in pages:
+        yield ''.join(encode(dict(zip(fields, row))) + '\n' for row in page).encode('utf-8')
+
+
+def iter_gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_export(dataset, export_format='csv', compress=False, chunk_size=2000, **filters):
+    """
+    Yield the encoded export of dataset chunk by chunk, ready to be written to a file or a StreamingHttpResponse.
+    """
+    if export_format not in FORMATS:
+        raise ExportError('Unknown format {}; choose from {}'.format(export_format, ', '.join(FORMATS)))
+    queryset, fields = build_queryset(dataset, **filters)
+    pages = iter_rows(queryset, fields, DATASETS[dataset]['date_field'], chunk_size)
+    chunks = iter_csv(pages, fields) if export_format == 'csv' else iter_ndjson(pages, fields)
+    return iter_gzip(chunks) if compress else chunks
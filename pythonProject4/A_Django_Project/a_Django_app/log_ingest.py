@@ -0,0 +1,393 @@
+import csv
+import datetime
+import json
+import os
+import re
+from collections import OrderedDict
+
+from django.db import transaction
+
+from . import rollups
+from .models import LogFile, Invocation, InvocationError, Reservation
+
+
+START_RE = re.compile(r'START RequestId: (\S+)(?: Version: (\S+))?')
+REPORT_RE = re.compile(r'REPORT RequestId: (\S+)')
+REPORT_FIELD_RE = re.compile(r'(Duration|Billed Duration|Memory Size|Max Memory Used): ([\d.]+)')
+LEVEL_RE = re.compile(r'\[(DEBUG|INFO|WARNING|ERROR|CRITICAL)\]\t([^\t]*)\t([^\t]*)\t(.*)', re.DOTALL)
+UNHANDLED_ERROR_RE = re.compile(r'\[ERROR\] (\w+): (.*)', re.DOTALL)
+TIMEOUT_RE = re.compile(r'\S+ (\S+) (Task timed out .*)', re.DOTALL)
+BOT_NAME_RE = re.compile(r'event\.bot\.name=(.*)')
+DISPATCH_RE = re.compile(r'dispatch userId=([^,]*), intentName=(.*)')
+RESERVATION_RE = re.compile(r'book(\w+) (?:at|under)=(\{.*\})', re.DOTALL)
+VALIDATION_FAILED_RE = re.compile(r'validationFailed intentName=([^,]*), slot=(.*)')
+
+# A turn starts a new conversation when the same user has not used the intent for this long (the bot's
+# idleSessionTTLInSeconds).
+CONVERSATION_IDLE = datetime.timedelta(seconds=600)
+
+# Exports are ordered by ingestion time, so DEBUG records of an invocation can follow its REPORT.  A finished
+# invocation waits this many records for such late records before it is turned into rows.
+LATE_RECORD_WINDOW = 500
+
+# Slot names vary between intents and bot versions; the first one present wins.
+CITY_KEYS = ('Location', 'PickUpCity', 'Arrival_City', 'ArrivalCity')
+START_DATE_KEYS = ('CheckInDate', 'PickUpDate', 'Leave_Date', 'LeaveDate')
+
+
+def iter_records(log, offset=0):
+    """
+    Yield (end_offset, timestamp_ms, message) for every record of a CloudWatch CSV export opened in binary mode.
+
+    Records are read line by line, joining lines while a quoted message is still open, so memory use does not depend
+    on the size of the file.  end_offset is the byte position just after the record and can be passed back as offset
+    to resume from there.
+    """
+    log.seek(offset)
+    pending = []
+    quotes = 0
+    while True:
+        line = log.readline()
+        if not line:
+            break
+        offset += len(line)
+        pending.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2:
+            continue
+        record = b''.join(pending).decode('utf-8', errors='replace')
+        pending = []
+        quotes = 0
+        for row in csv.reader([record]):
+            if len(row) < 2 or not row[0].isdigit():
+                # Header row or a blank line.
+                continue
+            yield offset, int(row[0]), row[1].rstrip('\n')
+
+
+def parse_timestamp(timestamp_ms):
+    return datetime.datetime.fromtimestamp(timestamp_ms / 1000, tz=datetime.timezone.utc)
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def first_value(details, keys):
+    for key in keys:
+        value = details.get(key)
+        if value:
+            return value
+    return None
+
+
+# Invocation fields a second row for the same request id can fill in when the first one left them empty.
+MERGED_FIELDS = ('version', 'bot_name', 'user_id', 'intent_name', 'violated_slot', 'duration_ms', 'billed_duration_ms',
+                 'memory_size_mb', 'max_memory_used_mb')
+
+
+def unique_invocations(invocations):
+    """
+    One Invocation per request id.  An invocation finished early, because too many were open, can get a second row
+    when its REPORT turns up; the rows are merged so it is stored and counted into the rollups once.
+    """
+    unique = {}
+    for invocation in invocations:
+        kept = unique.setdefault(invocation.request_id, invocation)
+        if kept is invocation:
+            continue
+        for field in MERGED_FIELDS:
+            if getattr(kept, field) in (None, ''):
+                setattr(kept, field, getattr(invocation, field))
+    return list(unique.values())
+
+
+class OpenInvocation:
+    """
+    What is known about an invocation from its START record until it is turned into rows.  There can be many of these
+    in flight, so they are kept as compact slotted records and only turned into Invocation model instances once
+    finished and past the late record window.
+
+    offset is where the invocation's first record starts, which is where a resumed run has to re-read from.
+    Reservations logged while the invocation is buffered wait here until its user and intent are known.
+    """
+    __slots__ = ('request_id', 'started_at', 'version', 'bot_name', 'user_id', 'intent_name', 'violated_slot',
+                 'offset', 'report', 'finished_at', 'reservations')
+
+    def __init__(self, request_id, started_at, version='', offset=0):
+        self.request_id = request_id
+        self.started_at = started_at
+        self.version = version
+        self.bot_name = ''
+        self.user_id = ''
+        self.intent_name = ''
+        self.violated_slot = ''
+        self.offset = offset
+        self.report = None
+        self.finished_at = 0
+        self.reservations = []
+
+
+class LogIngester:
+    """
+    Load one log export into Invocation, InvocationError and Reservation rows.
+
+    Rows are buffered and written with bulk_create once batch_size of them are waiting, each batch in its own
+    transaction together with the LogFile checkpoint and the matching rollup updates.  An invocation becomes rows once
+    its REPORT has been followed by LATE_RECORD_WINDOW more records.  The checkpoint is the first record of the oldest
+    invocation not written yet, so resuming re-reads at most the records of the invocations in flight; records that
+    were already stored are skipped.
+    """
+
+    def __init__(self, path, batch_size=2000, max_open_invocations=10000):
+        self.path = os.path.abspath(path)
+        self.batch_size = batch_size
+        self.max_open_invocations = max_open_invocations
+        self.log_file, _ = LogFile.objects.get_or_create(path=self.path)
+        self.open_invocations = OrderedDict()
+        # Invocations past their REPORT, in the order they finished, still accepting late records.
+        self.finished_invocations = OrderedDict()
+        # user and intent of recently finished invocations, for reservation records that arrive after REPORT.
+        self.recent_context = OrderedDict()
+        # start of the latest turn per (user, intent), to tell first turns of a conversation apart.
+        self.last_turns = OrderedDict()
+        self.invocations = []
+        self.errors = []
+        self.reservations = []
+        self.position = self.log_file.offset
+        self.counts = {'records': 0, 'invocations': 0, 'errors': 0, 'reservations': 0}
+
+    def run(self, offset=None):
+        if offset is not None:
+            self.position = offset
+        with open(self.path, 'rb') as log:
+            for end_offset, timestamp_ms, message in iter_records(log, self.position):
+                self.counts['records'] += 1
+                self.handle(end_offset, timestamp_ms, message)
+                self.position = end_offset
+                self.release_finished()
+                if len(self.invocations) + len(self.errors) + len(self.reservations) >= self.batch_size:
+                    self.flush()
+            self.position = log.tell()
+        # Whatever is still open at the end of the file never got its REPORT record.
+        while self.open_invocations:
+            self.finish(self.open_invocations.popitem(last=False)[1])
+        self.release_finished(everything=True)
+        self.flush()
+        return self.counts
+
+    def handle(self, offset, timestamp_ms, message):
+        match = LEVEL_RE.match(message)
+        if match:
+            level, _, request_id, text = match.groups()
+            if level == 'ERROR':
+                error_type, _, text = text.partition(': ') if ': ' in text else ('', '', text)
+                self.add_error(offset, timestamp_ms, request_id, error_type, text)
+            else:
+                self.handle_debug(offset, timestamp_ms, request_id, text)
+            return
+
+        if message.startswith('START RequestId:'):
+            request_id, version = START_RE.match(message).groups()
+            self.open_invocation(request_id, timestamp_ms, version or '')
+            return
+
+        if message.startswith('REPORT RequestId:'):
+            request_id = REPORT_RE.match(message).group(1)
+            report = dict(REPORT_FIELD_RE.findall(message))
+            invocation = self.finished_invocations.get(request_id)
+            if invocation is not None:
+                # Finished early, when too many invocations were open; the REPORT still belongs to it.
+                invocation.report = report
+                return
+            invocation = self.open_invocations.pop(request_id, None)
+            if invocation is None:
+                invocation = OpenInvocation(request_id, parse_timestamp(timestamp_ms), offset=self.position)
+            self.finish(invocation, report)
+            return
+
+        match = UNHANDLED_ERROR_RE.match(message)
+        if match:
+            # Unhandled exceptions carry no request id; they belong to the invocation started last.
+            request_id = next(reversed(self.open_invocations), '') if self.open_invocations else ''
+            self.add_error(offset, timestamp_ms, request_id, match.group(1), match.group(2))
+            return
+
+        match = TIMEOUT_RE.match(message)
+        if match:
+            self.add_error(offset, timestamp_ms, match.group(1), 'Timeout', match.group(2))
+
+    def handle_debug(self, offset, timestamp_ms, request_id, text):
+        invocation = self.open_invocations.get(request_id) or self.finished_invocations.get(request_id)
+        match = DISPATCH_RE.match(text)
+        if match:
+            invocation = invocation or self.early_invocation(request_id, timestamp_ms)
+            if invocation is not None:
+                invocation.user_id, invocation.intent_name = match.groups()
+            return
+        match = BOT_NAME_RE.match(text)
+        if match:
+            invocation = invocation or self.early_invocation(request_id, timestamp_ms)
+            if invocation is not None:
+                invocation.bot_name = match.group(1)
+            return
+        match = VALIDATION_FAILED_RE.match(text)
+        if match:
+            invocation = invocation or self.early_invocation(request_id, timestamp_ms)
+            if invocation is not None:
+                invocation.violated_slot = match.group(2)[:100]
+            return
+        match = RESERVATION_RE.match(text)
+        if match:
+            self.add_reservation(offset, timestamp_ms, request_id, invocation, match.group(1), match.group(2))
+
+    def early_invocation(self, request_id, timestamp_ms):
+        """
+        Open an invocation for a record logged ahead of its START, such as the first records of an export.  Returns
+        None for an invocation that has already been turned into rows.
+        """
+        if not request_id or request_id in self.recent_context:
+            return None
+        self.open_invocation(request_id, timestamp_ms, '')
+        return self.open_invocations.get(request_id)
+
+    def open_invocation(self, request_id, timestamp_ms, version):
+        invocation = self.open_invocations.get(request_id)
+        if invocation is not None:
+            # Opened by records logged ahead of this START; its offset already points at the first of them.
+            invocation.started_at = parse_timestamp(timestamp_ms)
+            invocation.version = version
+            return
+        self.open_invocations[request_id] = OpenInvocation(
+            request_id, parse_timestamp(timestamp_ms), version, self.position
+        )
+        if len(self.open_invocations) > self.max_open_invocations:
+            self.finish(self.open_invocations.popitem(last=False)[1])
+
+    def finish(self, invocation, report=None):
+        invocation.report = report
+        invocation.finished_at = self.counts['records']
+        self.finished_invocations[invocation.request_id] = invocation
+
+    def release_finished(self, everything=False):
+        """
+        Turn finished invocations into rows once they are past the late record window, or all of them at the end.
+        """
+        finished = self.finished_invocations
+        while finished:
+            invocation = next(iter(finished.values()))
+            if not (everything or len(finished) > self.max_open_invocations
+                    or self.counts['records'] - invocation.finished_at > LATE_RECORD_WINDOW):
+                break
+            del finished[invocation.request_id]
+            self.add_invocation(invocation)
+
+    def add_invocation(self, invocation):
+        report = invocation.report or {}
+        first_turn = False
+        if invocation.user_id:
+            key = (invocation.user_id, invocation.intent_name)
+            last_turn = self.last_turns.pop(key, None)
+            first_turn = last_turn is None or invocation.started_at - last_turn > CONVERSATION_IDLE
+            self.last_turns[key] = invocation.started_at
+            if len(self.last_turns) > self.max_open_invocations:
+                self.last_turns.popitem(last=False)
+        self.invocations.append(Invocation(
+            request_id=invocation.request_id,
+            started_at=invocation.started_at,
+            version=invocation.version,
+            bot_name=invocation.bot_name,
+            user_id=invocation.user_id,
+            intent_name=invocation.intent_name,
+            violated_slot=invocation.violated_slot,
+            first_turn=first_turn,
+            duration_ms=float(report['Duration']) if 'Duration' in report else None,
+            billed_duration_ms=int(float(report['Billed Duration'])) if 'Billed Duration' in report else None,
+            memory_size_mb=int(report['Memory Size']) if 'Memory Size' in report else None,
+            max_memory_used_mb=int(report['Max Memory Used']) if 'Max Memory Used' in report else None
+        ))
+        self.recent_context[invocation.request_id] = (invocation.user_id, invocation.intent_name)
+        if len(self.recent_context) > self.max_open_invocations:
+            self.recent_context.popitem(last=False)
+        for reservation in invocation.reservations:
+            reservation.user_id = invocation.user_id
+            reservation.intent_name = invocation.intent_name
+            self.reservations.append(reservation)
+
+    def add_error(self, offset, timestamp_ms, request_id, error_type, text):
+        self.errors.append(InvocationError(
+            log_file=self.log_file,
+            offset=offset,
+            request_id=request_id,
+            logged_at=parse_timestamp(timestamp_ms),
+            error_type=error_type[:100],
+            message=text
+        ))
+
+    def add_reservation(self, offset, timestamp_ms, request_id, invocation, booking, payload):
+        try:
+            details = json.loads(payload)
+        except ValueError:
+            self.add_error(offset, timestamp_ms, request_id, 'MalformedReservation', payload)
+            return
+        user_id, intent_name = self.recent_context.get(request_id, ('', ''))
+        reservation = Reservation(
+            log_file=self.log_file,
+            offset=offset,
+            request_id=request_id,
+            user_id=user_id,
+            intent_name=intent_name,
+            logged_at=parse_timestamp(timestamp_ms),
+            reservation_type=str(details.get('ReservationType') or booking)[:20],
+            city=str(first_value(details, CITY_KEYS) or '')[:100],
+            start_date=parse_date(first_value(details, START_DATE_KEYS)),
+            details=payload
+        )
+        if invocation is not None:
+            # Attributed once the invocation is turned into rows, when a late dispatch record has been seen too.
+            invocation.reservations.append(reservation)
+        else:
+            self.reservations.append(reservation)
+
+    def checkpoint(self):
+        """
+        Offset a resumed run has to start from so that no invocation still buffered loses records.
+        """
+        offsets = [invocation.offset for invocation in self.finished_invocations.values()]
+        if self.open_invocations:
+            offsets.append(next(iter(self.open_invocations.values())).offset)
+        return min(offsets, default=self.position)
+
+    def flush(self):
+        self.invocations = unique_invocations(self.invocations)
+        with transaction.atomic():
+            # Writing the checkpoint first takes SQLite's write lock before anything is read, so concurrent runs wait
+            # for each other instead of failing to upgrade a read lock.
+            self.log_file.offset = self.checkpoint()
+            self.log_file.save(update_fields=['offset', 'updated_at'])
+            self.write_batch()
+        self.counts['invocations'] += len(self.invocations)
+        self.counts['errors'] += len(self.errors)
+        self.counts['reservations'] += len(self.reservations)
+        self.invocations = []
+        self.errors = []
+        self.reservations = []
+
+    def write_batch(self):
+        # Skip rows stored by an earlier, interrupted run so that they are not counted into the rollups twice.
+        stored = set(Invocation.objects.filter(
+            request_id__in=[invocation.request_id for invocation in self.invocations]
+        ).values_list('request_id', flat=True))
+        invocations = [invocation for invocation in self.invocations if invocation.request_id not in stored]
+        stored = set(Reservation.objects.filter(
+            log_file=self.log_file, offset__in=[reservation.offset for reservation in self.reservations]
+        ).values_list('offset', flat=True))
+        reservations = [reservation for reservation in self.reservations if reservation.offset not in stored]
+
+        Invocation.objects.bulk_create(invocations, batch_size=self.batch_size, ignore_conflicts=True)
+        InvocationError.objects.bulk_create(self.errors, batch_size=self.batch_size, ignore_conflicts=True)
+        Reservation.objects.bulk_create(reservations, batch_size=self.batch_size, ignore_conflicts=True)
+        rollups.apply_batch(invocations, reservations)
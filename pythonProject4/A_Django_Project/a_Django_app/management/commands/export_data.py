@@ -0,0 +1,47 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from a_Django_app.exports import DATASETS, FORMATS, ExportError, iter_export
+
+
+class Command(BaseCommand):
+    help = 'Stream reservations or invocations to a CSV or NDJSON file (or stdout) without loading them into memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--format', dest='export_format', choices=FORMATS, default='csv')
+        parser.add_argument('--start', help='first day or moment to include (YYYY-MM-DD or ISO datetime, UTC)')
+        parser.add_argument('--end', help='day or moment to stop before (exclusive)')
+        parser.add_argument('--intent', help='only rows for this intent name')
+        parser.add_argument('--city', help='only reservations in this city')
+        parser.add_argument('--gzip', action='store_true', help='gzip the output')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='rows fetched per query (default 2000)')
+        parser.add_argument('-o', '--output', help='file to write to instead of stdout')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        try:
+            chunks = iter_export(
+                options['dataset'],
+                options['export_format'],
+                options['gzip'],
+                chunk_size=options['chunk_size'],
+                start=options['start'],
+                end=options['end'],
+                intent=options['intent'],
+                city=options['city'],
+            )
+        except ExportError as e:
+            raise CommandError(e)
+
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
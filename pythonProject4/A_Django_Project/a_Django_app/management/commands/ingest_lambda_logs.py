@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from a_Django_app.log_ingest import LogIngester
+
+
+class Command(BaseCommand):
+    help = 'Stream Lambda CloudWatch CSV exports into Invocation, InvocationError and Reservation rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='CSV exports such as logged-events-and-errors.csv')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='rows written per bulk_create and per transaction (default 2000)')
+        parser.add_argument('--offset', type=int, default=None,
+                            help='byte offset to start from instead of the stored checkpoint')
+        parser.add_argument('--from-start', action='store_true', help='ignore the stored checkpoints')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        if options['offset'] is not None and len(options['paths']) > 1:
+            raise CommandError('--offset can only be used with a single file')
+
+        for path in options['paths']:
+            if not os.path.isfile(path):
+                raise CommandError('{} is not a file'.format(path))
+            try:
+                ingester = LogIngester(path, batch_size=options['batch_size'])
+                offset = 0 if options['from_start'] else options['offset']
+                counts = ingester.run(offset)
+            except OSError as e:
+                raise CommandError('Cannot read {}: {}'.format(path, e))
+            self.stdout.write(self.style.SUCCESS(
+                '{}: {records} records, {invocations} invocations, {errors} errors, {reservations} reservations '
+                '(checkpoint at byte {offset})'.format(path, offset=ingester.log_file.offset, **counts)
+            ))
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=1024, unique=True)),
+                ('offset', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Invocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_id', models.CharField(max_length=64, unique=True)),
+                ('started_at', models.DateTimeField(db_index=True)),
+                ('version', models.CharField(blank=True, max_length=32)),
+                ('bot_name', models.CharField(blank=True, max_length=100)),
+                ('user_id', models.CharField(blank=True, db_index=True, max_length=100)),
+                ('intent_name', models.CharField(blank=True, max_length=100)),
+                ('duration_ms', models.FloatField(null=True)),
+                ('billed_duration_ms', models.IntegerField(null=True)),
+                ('memory_size_mb', models.IntegerField(null=True)),
+                ('max_memory_used_mb', models.IntegerField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['intent_name', 'started_at'], name='a_Django_ap_intent__2e9562_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='InvocationError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offset', models.BigIntegerField()),
+                ('request_id', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('logged_at', models.DateTimeField(db_index=True)),
+                ('error_type', models.CharField(blank=True, max_length=100)),
+                ('message', models.TextField()),
+                ('log_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='a_Django_app.logfile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('log_file', 'offset'), name='unique_invocation_error_record')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offset', models.BigIntegerField()),
+                ('request_id', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('user_id', models.CharField(blank=True, max_length=100)),
+                ('intent_name', models.CharField(blank=True, max_length=100)),
+                ('logged_at', models.DateTimeField()),
+                ('reservation_type', models.CharField(max_length=20)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('start_date', models.DateField(null=True)),
+                ('details', models.TextField()),
+                ('log_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='a_Django_app.logfile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['logged_at'], name='a_Django_ap_logged__ceaf1a_idx'), models.Index(fields=['reservation_type', 'logged_at'], name='a_Django_ap_reserva_54dc91_idx'), models.Index(fields=['city', 'logged_at'], name='a_Django_ap_city_ae65bf_idx')],
+                'constraints': [models.UniqueConstraint(fields=('log_file', 'offset'), name='unique_reservation_record')],
+            },
+        ),
+    ]
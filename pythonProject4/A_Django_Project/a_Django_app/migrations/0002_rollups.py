@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('a_Django_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invocation',
+            name='first_turn',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='invocation',
+            name='violated_slot',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.CreateModel(
+            name='IntentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('intent_name', models.CharField(blank=True, max_length=100)),
+                ('invocations', models.BigIntegerField(default=0)),
+                ('conversations', models.BigIntegerField(default=0)),
+                ('fulfilled', models.BigIntegerField(default=0)),
+                ('validation_failures', models.BigIntegerField(default=0)),
+                ('duration_histogram', models.JSONField(default=list)),
+                ('memory_histogram', models.JSONField(default=list)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket_start', 'intent_name'), name='unique_intent_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SlotFailureRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket_start', models.DateTimeField()),
+                ('intent_name', models.CharField(blank=True, max_length=100)),
+                ('slot', models.CharField(max_length=100)),
+                ('failures', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularity', 'bucket_start', 'intent_name', 'slot'), name='unique_slot_failure_rollup')],
+            },
+        ),
+    ]
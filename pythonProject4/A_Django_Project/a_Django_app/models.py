@@ -1,3 +1,148 @@
 from django.db import models
 
-# Create your models here.
+
+class LogFile(models.Model):
+    """
+    A Lambda log export that has been (partly) ingested.  offset is the byte position ingestion can resume from.
+    """
+    path = models.CharField(max_length=1024, unique=True)
+    offset = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.path
+
+
+class Invocation(models.Model):
+    """
+    One Lambda invocation, assembled from its START, DEBUG and REPORT records.
+    """
+    request_id = models.CharField(max_length=64, unique=True)
+    started_at = models.DateTimeField(db_index=True)
+    version = models.CharField(max_length=32, blank=True)
+    bot_name = models.CharField(max_length=100, blank=True)
+    user_id = models.CharField(max_length=100, blank=True, db_index=True)
+    intent_name = models.CharField(max_length=100, blank=True)
+    duration_ms = models.FloatField(null=True)
+    billed_duration_ms = models.IntegerField(null=True)
+    memory_size_mb = models.IntegerField(null=True)
+    max_memory_used_mb = models.IntegerField(null=True)
+    violated_slot = models.CharField(max_length=100, blank=True)
+    first_turn = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['intent_name', 'started_at']),
+        ]
+
+    def __str__(self):
+        return self.request_id
+
+
+class InvocationError(models.Model):
+    """
+    An [ERROR] record, or an unhandled exception, logged during an invocation.
+    """
+    log_file = models.ForeignKey(LogFile, on_delete=models.CASCADE)
+    offset = models.BigIntegerField()
+    request_id = models.CharField(max_length=64, blank=True, db_index=True)
+    logged_at = models.DateTimeField(db_index=True)
+    error_type = models.CharField(max_length=100, blank=True)
+    message = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['log_file', 'offset'], name='unique_invocation_error_record'),
+        ]
+
+    def __str__(self):
+        return '{} {}'.format(self.request_id, self.error_type)
+
+
+class Reservation(models.Model):
+    """
+    A reservation decoded from a bookFlight/bookCar/bookHotel debug record.
+    """
+    log_file = models.ForeignKey(LogFile, on_delete=models.CASCADE)
+    offset = models.BigIntegerField()
+    request_id = models.CharField(max_length=64, blank=True, db_index=True)
+    user_id = models.CharField(max_length=100, blank=True)
+    intent_name = models.CharField(max_length=100, blank=True)
+    logged_at = models.DateTimeField()
+    reservation_type = models.CharField(max_length=20)
+    city = models.CharField(max_length=100, blank=True)
+    start_date = models.DateField(null=True)
+    details = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['log_file', 'offset'], name='unique_reservation_record'),
+        ]
+        indexes = [
+            models.Index(fields=['logged_at']),
+            models.Index(fields=['reservation_type', 'logged_at']),
+            models.Index(fields=['city', 'logged_at']),
+        ]
+
+    def __str__(self):
+        return '{} {}'.format(self.reservation_type, self.request_id)
+
+
+class IntentRollup(models.Model):
+    """
+    Per-intent totals for one hour or one day, kept up to date by log ingestion so the dashboard never reads
+    Invocation rows.  The histograms hold counts per bin of rollups.DURATION_BINS_MS and rollups.MEMORY_BINS_MB.
+    """
+    HOUR = 'hour'
+    DAY = 'day'
+    GRANULARITY_CHOICES = [(HOUR, 'Hour'), (DAY, 'Day')]
+
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    intent_name = models.CharField(max_length=100, blank=True)
+    invocations = models.BigIntegerField(default=0)
+    conversations = models.BigIntegerField(default=0)
+    fulfilled = models.BigIntegerField(default=0)
+    validation_failures = models.BigIntegerField(default=0)
+    duration_histogram = models.JSONField(default=list)
+    memory_histogram = models.JSONField(default=list)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['granularity', 'bucket_start', 'intent_name'], name='unique_intent_rollup'),
+        ]
+
+    def __str__(self):
+        return '{} {} {}'.format(self.granularity, self.bucket_start, self.intent_name)
+
+
+class SlotFailureRollup(models.Model):
+    """
+    Validation failures per intent and slot for one hour or one day.
+    """
+    granularity = models.CharField(max_length=4, choices=IntentRollup.GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    intent_name = models.CharField(max_length=100, blank=True)
+    slot = models.CharField(max_length=100)
+    failures = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['granularity', 'bucket_start', 'intent_name', 'slot'], name='unique_slot_failure_rollup'
+            ),
+        ]
+
+    def __str__(self):
+        return '{} {} {} {}'.format(self.granularity, self.bucket_start, self.intent_name, self.slot)
+
+
+class RollupVersion(models.Model):
+    """
+    Counter bumped by every batch that changes the rollups.  The dashboard cache is keyed on it, so every process
+    serving the dashboard sees new rollups as soon as the ingesting process commits them.
+    """
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.version)
@@ -0,0 +1,236 @@
+import datetime
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import IntentRollup, SlotFailureRollup, RollupVersion
+
+
+# Upper bin edges; the last bin also takes everything above its edge.
+DURATION_BINS_MS = (1, 2, 3, 5, 7, 10, 15, 20, 30, 50, 75, 100, 150, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000,
+                    10000, 30000, 900000)
+MEMORY_BINS_MB = (16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 256, 320, 384, 512, 768, 1024, 1536, 2048,
+                  3072, 4096, 6144, 8192, 10240)
+
+GRANULARITIES = (IntentRollup.HOUR, IntentRollup.DAY)
+
+ROLLUP_VERSION_ID = 1
+
+
+def bucket_start(moment, granularity):
+    if granularity == IntentRollup.DAY:
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def bin_index(bins, value):
+    return min(bisect_left(bins, value), len(bins) - 1)
+
+
+def merge_histogram(total, counts):
+    if len(total) < len(counts):
+        total.extend([0] * (len(counts) - len(total)))
+    for index, count in enumerate(counts):
+        total[index] += count
+    return total
+
+
+def percentile(histogram, bins, fraction):
+    """
+    Return the upper edge of the bin holding the given fraction of the histogram's observations, or None if empty.
+    """
+    observations = sum(histogram)
+    if not observations:
+        return None
+    wanted = fraction * observations
+    seen = 0
+    for index, count in enumerate(histogram):
+        seen += count
+        if seen >= wanted:
+            return bins[index]
+    return bins[-1]
+
+
+def _new_intent_delta():
+    return {
+        'invocations': 0,
+        'conversations': 0,
+        'fulfilled': 0,
+        'validation_failures': 0,
+        'duration_histogram': [0] * len(DURATION_BINS_MS),
+        'memory_histogram': [0] * len(MEMORY_BINS_MB),
+    }
+
+
+def apply_batch(invocations, reservations):
+    """
+    Add a batch of newly stored invocations and reservations to the hourly and daily rollups.
+
+    Must run inside the transaction that stored them, so a rolled back batch leaves the rollups untouched.  Rows are
+    locked before they are read, so ingestion runs on different exports can apply batches at the same time.
+    """
+    intent_deltas = defaultdict(_new_intent_delta)
+    slot_deltas = defaultdict(int)
+    for invocation in invocations:
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(invocation.started_at, granularity), invocation.intent_name)
+            delta = intent_deltas[key]
+            delta['invocations'] += 1
+            delta['conversations'] += invocation.first_turn
+            if invocation.duration_ms is not None:
+                delta['duration_histogram'][bin_index(DURATION_BINS_MS, invocation.duration_ms)] += 1
+            if invocation.max_memory_used_mb is not None:
+                delta['memory_histogram'][bin_index(MEMORY_BINS_MB, invocation.max_memory_used_mb)] += 1
+            if invocation.violated_slot:
+                delta['validation_failures'] += 1
+                slot_deltas[key + (invocation.violated_slot,)] += 1
+    for reservation in reservations:
+        for granularity in GRANULARITIES:
+            key = (granularity, bucket_start(reservation.logged_at, granularity), reservation.intent_name)
+            intent_deltas[key]['fulfilled'] += 1
+
+    if not intent_deltas:
+        return
+    bump_version()
+    _merge_intent_rollups(intent_deltas)
+    _merge_slot_rollups(slot_deltas)
+
+
+def _locked_rows(model, keys, fields):
+    """
+    Create the rollup rows for keys that do not exist yet, then fetch them all locked for update, indexed by their
+    key tuple.  Another ingestion run adding to the same rows waits for this transaction instead of overwriting it.
+    """
+    model.objects.bulk_create([model(**dict(zip(fields, key))) for key in keys], ignore_conflicts=True)
+    rows = model.objects.select_for_update().filter(
+        granularity__in={key[0] for key in keys},
+        bucket_start__in={key[1] for key in keys},
+        intent_name__in={key[2] for key in keys},
+    )
+    return {tuple(getattr(row, field) for field in fields): row for row in rows}
+
+
+def _merge_intent_rollups(deltas):
+    fields = ('granularity', 'bucket_start', 'intent_name')
+    rows = _locked_rows(IntentRollup, deltas, fields)
+    updated = []
+    for key, delta in deltas.items():
+        row = rows[key]
+        row.invocations += delta['invocations']
+        row.conversations += delta['conversations']
+        row.fulfilled += delta['fulfilled']
+        row.validation_failures += delta['validation_failures']
+        row.duration_histogram = merge_histogram(row.duration_histogram, delta['duration_histogram'])
+        row.memory_histogram = merge_histogram(row.memory_histogram, delta['memory_histogram'])
+        updated.append(row)
+    IntentRollup.objects.bulk_update(updated, [
+        'invocations', 'conversations', 'fulfilled', 'validation_failures', 'duration_histogram', 'memory_histogram'
+    ])
+
+
+def _merge_slot_rollups(deltas):
+    if not deltas:
+        return
+    fields = ('granularity', 'bucket_start', 'intent_name', 'slot')
+    rows = _locked_rows(SlotFailureRollup, deltas, fields)
+    updated = []
+    for key, failures in deltas.items():
+        row = rows[key]
+        row.failures += failures
+        updated.append(row)
+    SlotFailureRollup.objects.bulk_update(updated, ['failures'])
+
+
+# --- Dashboard ---
+
+
+def bump_version():
+    """
+    Move the rollup version on, in the caller's transaction, so that cached dashboards are rebuilt once it commits.
+    """
+    if not RollupVersion.objects.filter(pk=ROLLUP_VERSION_ID).update(version=F('version') + 1):
+        RollupVersion.objects.bulk_create([RollupVersion(pk=ROLLUP_VERSION_ID, version=1)], ignore_conflicts=True)
+
+
+def dashboard_version():
+    """
+    The committed rollup version.  It lives in the database rather than the cache, which is per process by default.
+    """
+    return RollupVersion.objects.filter(pk=ROLLUP_VERSION_ID).values_list('version', flat=True).first() or 0
+
+
+def dashboard_summary(granularity, since):
+    """
+    Summarise the rollups from since onwards: per-intent volume, conversion and percentiles, and failures per slot.
+    """
+    intents = {}
+    series = defaultdict(int)
+    for row in IntentRollup.objects.filter(granularity=granularity, bucket_start__gte=since):
+        intent = intents.setdefault(row.intent_name, {
+            'intent_name': row.intent_name,
+            'invocations': 0,
+            'conversations': 0,
+            'fulfilled': 0,
+            'validation_failures': 0,
+            'duration_histogram': [],
+            'memory_histogram': [],
+            'slots': [],
+        })
+        intent['invocations'] += row.invocations
+        intent['conversations'] += row.conversations
+        intent['fulfilled'] += row.fulfilled
+        intent['validation_failures'] += row.validation_failures
+        merge_histogram(intent['duration_histogram'], row.duration_histogram)
+        merge_histogram(intent['memory_histogram'], row.memory_histogram)
+        series[row.bucket_start] += row.invocations
+
+    slot_failures = defaultdict(int)
+    for row in SlotFailureRollup.objects.filter(granularity=granularity, bucket_start__gte=since):
+        slot_failures[(row.intent_name, row.slot)] += row.failures
+
+    for (intent_name, slot), failures in sorted(slot_failures.items()):
+        intent = intents.get(intent_name)
+        if intent is None:
+            continue
+        intent['slots'].append({
+            'slot': slot,
+            'failures': failures,
+            'failure_rate': failures / intent['invocations'] if intent['invocations'] else None,
+        })
+
+    for intent in intents.values():
+        intent['conversion'] = intent['fulfilled'] / intent['conversations'] if intent['conversations'] else None
+        intent['duration_ms'] = {
+            'p50': percentile(intent['duration_histogram'], DURATION_BINS_MS, 0.5),
+            'p90': percentile(intent['duration_histogram'], DURATION_BINS_MS, 0.9),
+            'p99': percentile(intent['duration_histogram'], DURATION_BINS_MS, 0.99),
+        }
+        intent['max_memory_used_mb'] = {
+            'p50': percentile(intent['memory_histogram'], MEMORY_BINS_MB, 0.5),
+            'p90': percentile(intent['memory_histogram'], MEMORY_BINS_MB, 0.9),
+            'p99': percentile(intent['memory_histogram'], MEMORY_BINS_MB, 0.99),
+        }
+        del intent['duration_histogram']
+        del intent['memory_histogram']
+
+    return {
+        'intents': sorted(intents.values(), key=lambda intent: -intent['invocations']),
+        'series': [{'bucket_start': start, 'invocations': count} for start, count in sorted(series.items())],
+    }
+
+
+def cached_dashboard_summary(granularity, days, timeout=300):
+    """
+    dashboard_summary for the last days, cached until the rollups change or timeout seconds pass.
+    """
+    key = 'ops_dashboard:{}:{}:{}'.format(dashboard_version(), granularity, days)
+    summary = cache.get(key)
+    if summary is None:
+        since = bucket_start(
+            datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days), granularity
+        )
+        summary = dashboard_summary(granularity, since)
+        cache.set(key, summary, timeout)
+    return summary
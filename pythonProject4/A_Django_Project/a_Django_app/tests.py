@@ -1,3 +1,350 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from . import admin, exports, log_ingest, rollups
+from .log_ingest import LogIngester, iter_records
+from .models import LogFile, Invocation, InvocationError, Reservation, IntentRollup, SlotFailureRollup
+
+
+SAMPLE_LOG = os.path.join(settings.BASE_DIR.parent.parent, 'logged-events-and-errors.csv')
+
+START_MS = int(datetime.datetime(2022, 6, 29, 13, tzinfo=datetime.timezone.utc).timestamp() * 1000)
+
+
+def invocation_records(index, intent_name='BookHotel', violated_slot=None, reservation=None, late=False):
+    """
+    The records Lambda logs for one invocation, as (timestamp_ms, message) pairs.  late moves the DEBUG records
+    after the REPORT, the way CloudWatch exports sometimes order them.
+    """
+    request_id = 'request-{:04d}'.format(index)
+    timestamp = START_MS + index * 1000
+
+    def debug(text):
+        return timestamp + 1, '[DEBUG]\t2022-06-29T13:00:00.000Z\t{}\t{}\n'.format(request_id, text)
+
+    details = [
+        debug('event.bot.name=BookTripTestTwo'),
+        debug('dispatch userId=user-{}, intentName={}'.format(index % 3, intent_name)),
+    ]
+    if violated_slot:
+        details.append(debug('validationFailed intentName={}, slot={}'.format(intent_name, violated_slot)))
+    if reservation:
+        details.append(debug('bookHotel under={}'.format(reservation)))
+    start = [(timestamp, 'START RequestId: {} Version: $LATEST\n'.format(request_id))]
+    end = [
+        (timestamp + 2, 'END RequestId: {}\n'.format(request_id)),
+        (timestamp + 2, 'REPORT RequestId: {}\tDuration: 2.50 ms\tBilled Duration: 3 ms\tMemory Size: 128 MB\t'
+                        'Max Memory Used: 40 MB\t\n'.format(request_id)),
+    ]
+    return start + end + details if late else start + details + end
+
+
+def fixture_records():
+    records = []
+    for index in range(12):
+        records += invocation_records(
+            index,
+            intent_name=('BookHotel', 'BookCar')[index % 2],
+            violated_slot='Nights' if index % 4 == 0 else None,
+            reservation='{\n  "ReservationType": "Hotel",\n  "Location": "sydney"\n}' if index % 3 == 0 else None,
+            late=index in (5, 6)
+        )
+    records.append((START_MS + 20000, '[ERROR]\t2022-06-29T13:00:20.000Z\trequest-0011\tValueError: bad date\n'))
+    return records
+
+
+def write_log(path, records):
+    with open(path, 'w', newline='') as log:
+        writer = csv.writer(log)
+        writer.writerow(['timestamp', 'message'])
+        writer.writerows(records)
+
+
+class IterRecordsTest(TestCase):
+
+    def test_multi_line_records_and_offsets(self):
+        data = (
+            b'timestamp,message\n'
+            b'1,"START RequestId: a\n"\n'
+            b'2,"[DEBUG]\tt\ta\tbookHotel under={\n  ""Location"": ""sydney""\n}\n"\n'
+            b'3,"END RequestId: a\n"\n'
+        )
+        records = list(iter_records(io.BytesIO(data)))
+        self.assertEqual([timestamp for _, timestamp, _ in records], [1, 2, 3])
+        self.assertEqual(records[1][2], '[DEBUG]\tt\ta\tbookHotel under={\n  "Location": "sydney"\n}')
+        self.assertEqual(records[-1][0], len(data))
+        # Every end offset is a place reading can resume from.
+        for position, (offset, _, _) in enumerate(records):
+            self.assertEqual(list(iter_records(io.BytesIO(data), offset)), records[position + 1:])
+
+
+class LogIngesterTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'log.csv')
+        write_log(self.path, fixture_records())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assert_fixture_stored(self):
+        self.assertEqual(Invocation.objects.count(), 12)
+        self.assertEqual(Reservation.objects.count(), 4)
+        self.assertEqual(InvocationError.objects.count(), 1)
+        self.assertFalse(Invocation.objects.filter(intent_name='').exists())
+        self.assertFalse(Reservation.objects.filter(intent_name='').exists())
+        for granularity in (IntentRollup.HOUR, IntentRollup.DAY):
+            rows = IntentRollup.objects.filter(granularity=granularity)
+            totals = rows.aggregate(invocations=Sum('invocations'), fulfilled=Sum('fulfilled'),
+                                       failures=Sum('validation_failures'))
+            self.assertEqual(totals, {'invocations': 12, 'fulfilled': 4, 'failures': 3})
+            self.assertEqual(rows.get(intent_name='BookHotel').invocations, 6)
+            self.assertEqual(
+                SlotFailureRollup.objects.filter(granularity=granularity).aggregate(Sum('failures'))['failures__sum'], 3
+            )
+
+    def test_ingest(self):
+        counts = LogIngester(self.path).run()
+        self.assertEqual(counts['invocations'], 12)
+        self.assert_fixture_stored()
+        self.assertEqual(LogFile.objects.get().offset, os.path.getsize(self.path))
+        late = Invocation.objects.get(request_id='request-0006')
+        self.assertEqual((late.intent_name, late.user_id, late.bot_name), ('BookHotel', 'user-0', 'BookTripTestTwo'))
+        self.assertEqual(late.duration_ms, 2.5)
+        self.assertEqual(Reservation.objects.get(request_id='request-0006').intent_name, 'BookHotel')
+
+    def test_resume_from_checkpoint(self):
+        flushes = []
+
+        def interrupted_flush(ingester):
+            if flushes:
+                raise KeyboardInterrupt
+            flushes.append(ingester.checkpoint())
+            original_flush(ingester)
+
+        original_flush = LogIngester.flush
+        with mock.patch.object(log_ingest, 'LATE_RECORD_WINDOW', 3), \
+                mock.patch.object(LogIngester, 'flush', interrupted_flush):
+            with self.assertRaises(KeyboardInterrupt):
+                LogIngester(self.path, batch_size=10).run()
+        checkpoint = LogFile.objects.get().offset
+        self.assertEqual(checkpoint, flushes[0])
+        self.assertTrue(0 < checkpoint < os.path.getsize(self.path))
+        self.assertLess(Invocation.objects.count(), 12)
+
+        with mock.patch.object(log_ingest, 'LATE_RECORD_WINDOW', 3):
+            LogIngester(self.path, batch_size=10).run()
+        self.assert_fixture_stored()
+
+    def test_reingest_skips_stored_rows(self):
+        LogIngester(self.path).run()
+        counts = LogIngester(self.path).run(offset=0)
+        self.assertEqual(counts['records'], len(fixture_records()))
+        self.assert_fixture_stored()
+
+    def test_resume_from_mid_invocation_offset(self):
+        LogIngester(self.path).run()
+        with open(self.path, 'rb') as log:
+            offsets = [offset for offset, _, _ in iter_records(log)]
+        LogIngester(self.path).run(offset=offsets[len(offsets) // 2])
+        self.assert_fixture_stored()
+
+    def test_invocation_finished_early_is_counted_once(self):
+        # With one open invocation allowed, request-0001's START finishes request-0000 before its REPORT arrives.
+        records = fixture_records()
+        records.insert(1, invocation_records(1)[0])
+        write_log(self.path, records)
+        with mock.patch.object(log_ingest, 'LATE_RECORD_WINDOW', 0):
+            LogIngester(self.path, max_open_invocations=1).run()
+        self.assertEqual(Invocation.objects.count(), 12)
+        self.assertEqual(Invocation.objects.get(request_id='request-0000').duration_ms, 2.5)
+        self.assertEqual(IntentRollup.objects.filter(granularity=IntentRollup.DAY).aggregate(
+            Sum('invocations'))['invocations__sum'], 12)
+
+    def test_sample_export(self):
+        LogIngester(SAMPLE_LOG).run()
+        self.assertEqual(Invocation.objects.count(), 20)
+        self.assertFalse(Invocation.objects.filter(intent_name='').exists())
+        reservation = Reservation.objects.get(request_id__startswith='e534db49')
+        self.assertEqual(reservation.intent_name, 'BookHotel')
+
+
+class DashboardTest(TestCase):
+
+    def test_cached_summary_follows_committed_rollups(self):
+        self.assertEqual(rollups.cached_dashboard_summary(IntentRollup.DAY, 7)['intents'], [])
+        now = int(datetime.datetime.now(datetime.timezone.utc).timestamp() * 1000)
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'log.csv')
+            write_log(path, [
+                (now, 'START RequestId: a\n'),
+                (now, '[DEBUG]\tt\ta\tdispatch userId=u, intentName=BookCar\n'),
+                (now, 'REPORT RequestId: a\tDuration: 1.00 ms\n'),
+            ])
+            version = rollups.dashboard_version()
+            LogIngester(path).run()
+        finally:
+            shutil.rmtree(directory)
+        self.assertGreater(rollups.dashboard_version(), version)
+        intents = rollups.cached_dashboard_summary(IntentRollup.DAY, 7)['intents']
+        self.assertEqual([(intent['intent_name'], intent['invocations']) for intent in intents], [('BookCar', 1)])
+
+
+class RawTableAdminTest(TestCase):
+
+    def test_change_lists_never_count_the_whole_table(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        started_at = datetime.datetime(2022, 6, 29, 13, tzinfo=datetime.timezone.utc)
+        Invocation.objects.bulk_create(
+            Invocation(request_id='request-{}'.format(index), started_at=started_at) for index in range(5)
+        )
+        with mock.patch.object(admin.CappedCountPaginator, 'COUNT_LIMIT', 3), \
+                mock.patch.object(admin.InvocationAdmin, 'list_per_page', 2), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/a_Django_app/invocation/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+        statements = [query['sql'] for query in queries.captured_queries if 'a_django_app_invocation' in
+                      query['sql'].lower()]
+        self.assertTrue(all('LIMIT' in statement for statement in statements), statements)
+
+
+class ExportBoundsTest(TestCase):
+
+    def test_impossible_dates_are_export_errors(self):
+        for value in ('2022-13-45', '2022-02-30', '2022-02-28T25:00', 'yesterday'):
+            with self.assertRaises(exports.ExportError):
+                exports.parse_bound(value)
+        self.assertEqual(exports.parse_bound('2022-02-28'),
+                         datetime.datetime(2022, 2, 28, tzinfo=datetime.timezone.utc))
+
+
+class ExportTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        log_file = LogFile.objects.create(path='export.csv')
+        start = datetime.datetime(2022, 6, 29, 13, tzinfo=datetime.timezone.utc)
+        # Several rows share a timestamp so pages have to break ties on id.
+        moments = [start + datetime.timedelta(hours=hours) for hours in (5, 0, 1, 1, 1, 2, 30, 1, 48)]
+        cls.invocations = [Invocation.objects.create(
+            request_id='request-{}'.format(index),
+            started_at=moment,
+            user_id='user-{}'.format(index % 3),
+            intent_name=('BookHotel', 'BookCar')[index % 2],
+            duration_ms=1.5 * index,
+            first_turn=index % 4 == 0
+        ) for index, moment in enumerate(moments)]
+        cls.reservations = [Reservation.objects.create(
+            log_file=log_file,
+            offset=index,
+            request_id='request-{}'.format(index),
+            intent_name='BookHotel',
+            logged_at=moment,
+            reservation_type='Hotel',
+            city=('Sydney', 'sydney', 'Zürich')[index % 3],
+            start_date=moment.date(),
+            details=json.dumps({'Location': 'Zürich', 'Nights': index})
+        ) for index, moment in enumerate(moments)]
+
+    def expected(self, rows, dataset, start=None, end=None, intent=None, city=None):
+        spec = exports.DATASETS[dataset]
+        date_field = spec['date_field']
+        rows = [row for row in rows
+                if (start is None or getattr(row, date_field) >= exports.parse_bound(start))
+                and (end is None or getattr(row, date_field) < exports.parse_bound(end))
+                and (intent is None or row.intent_name == intent)
+                and (city is None or row.city.lower() == city.lower())]
+        rows.sort(key=lambda row: (getattr(row, date_field), row.id))
+        return [{field: exports._text(getattr(row, field)) for field in spec['fields']} for row in rows]
+
+    def export(self, dataset, export_format, compress=False, **filters):
+        data = b''.join(exports.iter_export(dataset, export_format, compress, chunk_size=2, **filters))
+        return gzip.decompress(data) if compress else data
+
+    def test_ndjson_pages_match_rows(self):
+        cases = [
+            ('invocations', self.invocations, {}),
+            ('invocations', self.invocations, {'intent': 'BookCar', 'start': '2022-06-29T14:00'}),
+            ('invocations', self.invocations, {'start': '2022-06-29', 'end': '2022-06-30'}),
+            ('reservations', self.reservations, {'city': 'SYDNEY'}),
+            ('reservations', self.reservations, {'intent': 'BookHotel', 'end': '2022-07-01'}),
+        ]
+        for dataset, rows, filters in cases:
+            for compress in (False, True):
+                with self.subTest(dataset=dataset, filters=filters, compress=compress):
+                    data = self.export(dataset, 'ndjson', compress, **filters)
+                    got = [json.loads(line) for line in data.decode('utf-8').splitlines()]
+                    expected = self.expected(rows, dataset, **filters)
+                    self.assertGreater(len(expected), 2)
+                    self.assertEqual(got, expected)
+
+    def test_csv_pages_match_rows(self):
+        for compress in (False, True):
+            data = self.export('reservations', 'csv', compress)
+            header, *rows = csv.reader(io.StringIO(data.decode('utf-8')))
+            self.assertEqual(tuple(header), exports.DATASETS['reservations']['fields'])
+            expected = self.expected(self.reservations, 'reservations')
+            self.assertEqual(rows, [[str(value) for value in row.values()] for row in expected])
+
+    def test_empty_export(self):
+        self.assertEqual(self.export('invocations', 'ndjson', start='2030-01-01'), b'')
+        self.assertEqual(self.export('invocations', 'csv', True, start='2030-01-01').decode('utf-8').splitlines(),
+                         [','.join(exports.DATASETS['invocations']['fields'])])
+
+    def test_invalid_requests(self):
+        for dataset, filters in (('flights', {}), ('invocations', {'city': 'sydney'}),
+                                 ('invocations', {'start': '2022-13-45'}), ('invocations', {'end': 'yesterday'})):
+            with self.subTest(dataset=dataset, filters=filters), self.assertRaises(exports.ExportError):
+                exports.iter_export(dataset, **filters)
+        with self.assertRaises(exports.ExportError):
+            exports.iter_export('invocations', 'xml')
+
+    def test_view(self):
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get('/admin/export/invocations/', {'format': 'ndjson', 'gzip': '1',
+                                                                  'intent': 'BookHotel'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('invocations.ndjson.gz', response['Content-Disposition'])
+        data = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        self.assertEqual([json.loads(line) for line in data.splitlines()],
+                         self.expected(self.invocations, 'invocations', intent='BookHotel'))
+        for path, query in (('/admin/export/flights/', {}), ('/admin/export/invocations/', {'start': '2022-13-45'}),
+                            ('/admin/export/invocations/', {'format': 'xml'}),
+                            ('/admin/export/invocations/', {'city': 'sydney'})):
+            with self.subTest(path=path, query=query):
+                self.assertEqual(self.client.get(path, query).status_code, 400)
 
-# Create your tests here.
+    def test_export_data_command(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'reservations.ndjson.gz')
+            call_command('export_data', 'reservations', '--format', 'ndjson', '--gzip', '--chunk-size', '2',
+                         '--city', 'zürich', '-o', path)
+            with gzip.open(path, 'rt', encoding='utf-8') as output:
+                got = [json.loads(line) for line in output]
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(got, self.expected(self.reservations, 'reservations', city='zürich'))
+        for arguments in (['--start', '2022-02-30'], ['--chunk-size', '0'], ['--city', 'sydney']):
+            with self.subTest(arguments=arguments), self.assertRaises(CommandError):
+                call_command('export_data', 'invocations', *arguments)
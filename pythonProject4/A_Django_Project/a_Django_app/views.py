@@ -1,6 +1,65 @@
-from django.http import HttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import render
+
+from .exports import ExportError, iter_export
+from .models import IntentRollup
+from .rollups import cached_dashboard_summary
 
 
 def index(request):
     return HttpResponse("Hello and Welcome to Booker Bot")
 # Create your views here.
+
+
+@staff_member_required
+def ops_dashboard(request):
+    """
+    Operations dashboard in the admin, read entirely from the hourly/daily rollups.
+    """
+    granularity = request.GET.get('granularity', IntentRollup.DAY)
+    if granularity not in (IntentRollup.HOUR, IntentRollup.DAY):
+        granularity = IntentRollup.DAY
+    try:
+        days = min(max(int(request.GET.get('days', 7)), 1), 366)
+    except ValueError:
+        days = 7
+
+    summary = cached_dashboard_summary(granularity, days)
+    return render(request, 'admin/ops_dashboard.html', {
+        'title': 'Operations dashboard',
+        'granularity': granularity,
+        'days': days,
+        'intents': summary['intents'],
+        'series': summary['series'],
+    })
+
+
+@staff_member_required
+def export(request, dataset):
+    """
+    Stream reservations or invocations as CSV or NDJSON.
+
+    Query parameters: format (csv or ndjson), start and end (YYYY-MM-DD or ISO datetime, end exclusive), intent,
+    city, and gzip=1 to compress on the fly.
+    """
+    export_format = request.GET.get('format', 'csv')
+    compress = request.GET.get('gzip') in ('1', 'true', 'yes')
+    try:
+        chunks = iter_export(
+            dataset,
+            export_format,
+            compress,
+            start=request.GET.get('start'),
+            end=request.GET.get('end'),
+            intent=request.GET.get('intent'),
+            city=request.GET.get('city'),
+        )
+    except ExportError as e:
+        return HttpResponseBadRequest(str(e))
+
+    content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = '{}.{}{}'.format(dataset, export_format, '.gz' if compress else '')
+    response = StreamingHttpResponse(chunks, content_type='application/gzip' if compress else content_type)
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+    return response
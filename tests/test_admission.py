@@ -0,0 +1,177 @@
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admission
+
+
+def event(user_id, bot_name='BookTripTestTwo'):
+    return {'bot': {'name': bot_name}, 'userId': user_id}
+
+
+class MemoryBucketsTest(unittest.TestCase):
+
+    def test_refilling_buckets_are_not_forgotten(self):
+        buckets = admission.MemoryBuckets(rate=1.0, burst=2.0, max_keys=2)
+        self.assertTrue(buckets.take('abuser', 0.0))
+        self.assertTrue(buckets.take('abuser', 0.0))
+        self.assertFalse(buckets.take('abuser', 0.0))
+        # A flood of new keys is shed instead of pushing the empty bucket out of the map.
+        self.assertTrue(buckets.take('user-1', 0.1))
+        self.assertFalse(buckets.take('user-2', 0.2))
+        self.assertFalse(buckets.take('abuser', 0.3))
+
+    def test_refilled_buckets_are_dropped(self):
+        buckets = admission.MemoryBuckets(rate=1.0, burst=2.0, max_keys=2)
+        buckets.take('user-1', 0.0)
+        buckets.take('user-2', 0.0)
+        self.assertTrue(buckets.take('user-3', 2.5))
+        self.assertEqual(len(buckets), 1)
+
+
+class SQLiteBucketsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'buckets.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def buckets(self):
+        buckets = admission.SQLiteBuckets(rate=1.0, burst=2.0, path=self.path)
+        self.addCleanup(buckets.connection.close)
+        return buckets
+
+    def test_commits_do_not_fsync(self):
+        buckets = self.buckets()
+        self.assertEqual(buckets.connection.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        # 1 is NORMAL; the default, FULL, is 2.
+        self.assertEqual(buckets.connection.execute('PRAGMA synchronous').fetchone()[0], 1)
+
+    def test_buckets_are_shared_between_connections(self):
+        first, second = self.buckets(), self.buckets()
+        self.assertTrue(first.take('user', 0.0))
+        self.assertTrue(second.take('user', 0.0))
+        self.assertFalse(first.take('user', 0.0))
+        self.assertTrue(second.take('other', 0.0))
+        self.assertTrue(second.take('user', 1.0))
+        self.assertEqual(len(first), 2)
+
+    def test_idle_buckets_are_purged(self):
+        buckets = self.buckets()
+        buckets.PURGE_EVERY = 3
+        buckets.take('idle', 0.0)
+        buckets.take('active', 5.0)
+        buckets.take('active', 5.0)
+        self.assertEqual(len(buckets), 1)
+
+
+class StubRedis:
+    """
+    Runs RedisBuckets.SCRIPT's logic against a dict, and fails every call while down is set.
+    """
+
+    def __init__(self):
+        self.hashes = {}
+        self.calls = []
+        self.down = False
+
+    def eval(self, script, key_count, key, rate, burst, now):
+        self.calls.append((script, key_count, key))
+        if self.down:
+            raise ConnectionError('redis is down')
+        bucket = self.hashes.get(key)
+        tokens = burst if bucket is None else min(burst, bucket[0] + (now - bucket[1]) * rate)
+        admitted = tokens >= 1
+        self.hashes[key] = (tokens - 1 if admitted else tokens, now)
+        return int(admitted)
+
+
+class RedisBucketsTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.client = StubRedis()
+        admission.configure(rate=1.0, burst=2.0, backend='redis', client=self.client)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        admission.configure()
+
+    def test_take(self):
+        buckets = admission.RedisBuckets(rate=1.0, burst=1.0, client=self.client, prefix='test:')
+        self.assertIs(buckets.take('user', 0.0), True)
+        self.assertIs(buckets.take('user', 0.5), False)
+        self.assertIs(buckets.take('user', 1.5), True)
+        self.assertEqual(self.client.calls[0], (admission.RedisBuckets.SCRIPT, 1, 'test:user'))
+
+    def test_admit_sheds_through_redis(self):
+        results = [admission.admit(event('redis-user')) for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(self.client.calls[0][2], 'admission:BookTripTestTwo\x00redis-user')
+
+    def test_admit_fails_open_when_the_backend_fails(self):
+        before = admission.metrics()
+        self.client.down = True
+        self.assertTrue(all(admission.admit(event('redis-user')) for _ in range(5)))
+        after = admission.metrics()
+        self.assertEqual(after['backend_errors'] - before['backend_errors'], 5)
+        self.assertEqual(after['admitted'] - before['admitted'], 5)
+        self.assertEqual(after['shed'], before['shed'])
+
+        self.client.down = False
+        self.assertTrue(admission.admit(event('redis-user')))
+        self.assertEqual(admission.metrics()['backend_errors'], after['backend_errors'])
+
+    def test_redis_backend_needs_a_client(self):
+        with self.assertRaises(ValueError):
+            admission.configure(rate=1.0, backend='redis')
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.handler = logging.StreamHandler(self.stream)
+        admission.metrics_logger.addHandler(self.handler)
+        admission.metrics_logger.removeHandler(admission._metrics_handler)
+        admission.configure(rate=1.0, burst=1.0, backend='')
+        admission.emit_metrics(time.time() - admission.SHED_METRICS_INTERVAL)
+        self.stream.truncate(0)
+        self.stream.seek(0)
+
+    def tearDown(self):
+        admission.metrics_logger.removeHandler(self.handler)
+        admission.metrics_logger.addHandler(admission._metrics_handler)
+        admission.configure()
+
+    def lines(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_shed_events_are_emitted(self):
+        self.assertTrue(admission.admit(event('metrics-user')))
+        self.assertFalse(admission.admit(event('metrics-user')))
+        totals, by_bot = self.lines()
+        self.assertEqual(totals['_aws']['CloudWatchMetrics'][0]['Namespace'], admission.METRICS_NAMESPACE)
+        self.assertEqual((totals['Admitted'], totals['Shed'], totals['Rate'], totals['Burst']), (1, 1, 1.0, 1.0))
+        self.assertEqual((by_bot['BotName'], by_bot['Shed']), ('BookTripTestTwo', 1))
+        self.assertEqual(by_bot['_aws']['CloudWatchMetrics'][0]['Dimensions'], [['BotName']])
+
+        # Counters are reported as differences, and shedding emits at most once per SHED_METRICS_INTERVAL.
+        self.assertFalse(admission.admit(event('metrics-user')))
+        self.assertEqual(len(self.lines()), 2)
+        admission.emit_metrics()
+        self.assertEqual(self.lines()[2]['Shed'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
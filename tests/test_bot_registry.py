@@ -0,0 +1,79 @@
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot_registry
+import lambda_function
+
+
+def export(name, version, intents=('BookHotel',), cities=None):
+    resource = {
+        'name': name,
+        'version': version,
+        'intents': [{'name': intent, 'slots': [{'name': 'Location', 'slotType': 'Cities'}]} for intent in intents],
+        'slotTypes': [],
+    }
+    if cities:
+        resource['slotTypes'].append({'name': 'Cities', 'enumerationValues': [{'value': city} for city in cities]})
+    return {'metadata': {'schemaVersion': '1.0'}, 'resource': resource}
+
+
+class BotRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.directory = tempfile.mkdtemp()
+        for file_name, definition in (
+            ('BrandB_v1.json', export('BrandB', '1', cities=['hobart'])),
+            ('BrandB_v2.json', export('BrandB', '2', intents=('BookHotel', 'BookCar'), cities=['darwin'])),
+            ('other.json', export('BrandC', '$LATEST')),
+            ('notes.json', {'not': 'a bot'}),
+        ):
+            with open(os.path.join(self.directory, file_name), 'w') as definition_file:
+                json.dump(definition, definition_file)
+        self.registry = bot_registry.BotRegistry(
+            lambda_function.INTENT_HANDLERS, lambda_function.DEFAULT_VOCABULARY, self.directory, max_bots=2
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        logging.disable(logging.NOTSET)
+
+    def test_requested_versions_share_the_resolved_bot(self):
+        latest = self.registry.get({'name': 'BrandB', 'version': '$LATEST'})
+        self.assertIs(self.registry.get({'name': 'BrandB', 'version': '7'}), latest)
+        self.assertIs(self.registry.get({'name': 'BrandB', 'version': '2'}), latest)
+        self.assertEqual((latest.version, sorted(latest.intents)), ('2', ['BookCar', 'BookHotel']))
+        self.assertEqual(latest.vocabulary['cities'], frozenset(['darwin']))
+        self.assertEqual(self.registry.get({'name': 'BrandB', 'version': '1'}).version, '1')
+        stats = self.registry.stats()
+        self.assertEqual((stats['compiled'], stats['cached_bots'], stats['indexed']), (2, 2, 1))
+
+    def test_unknown_bots_do_not_read_the_directory(self):
+        self.registry.get({'name': 'BrandB'})
+        with mock.patch.object(bot_registry.BotRegistry, 'read_definition') as read_definition:
+            for index in range(100):
+                bot = self.registry.get({'name': 'Unknown{}'.format(index), 'version': '$LATEST'})
+                self.assertIs(bot, self.registry.default_bot)
+            self.registry.get({'name': 'BrandB'})
+        read_definition.assert_not_called()
+        self.assertEqual(self.registry.stats()['indexed'], 1)
+
+    def test_least_recently_used_bot_is_evicted(self):
+        self.registry.get({'name': 'BrandB', 'version': '1'})
+        self.registry.get({'name': 'BrandB', 'version': '2'})
+        self.registry.get({'name': 'BrandB', 'version': '1'})
+        self.registry.get({'name': 'BrandC'})
+        self.assertEqual(list(self.registry.bots), [('BrandB', '1'), ('BrandC', '$LATEST')])
+        self.assertEqual(self.registry.stats()['evicted'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
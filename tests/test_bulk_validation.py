@@ -0,0 +1,136 @@
+import datetime
+import logging
+import os
+import random
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bulk_validation
+import lambda_function
+
+
+CITIES = ('sydney', 'Paris', 'New York', '', None, 'hobart', 'atlantis', 'PERTH', 42)
+CAR_TYPES = ('economy', 'Luxury', 'tank', None, '', 7)
+ROOM_TYPES = ('king', 'Queen', 'suite', None, '', 7)
+AGES = (None, '', '17', '18', '25', 17, '30', ' 19', 16.0, '17.0', 'old', '99999999999999999999')
+NIGHTS = (None, '', '0', '1', '30', '31', 5, 'x', '2.5')
+
+
+def scalar(validator, slots):
+    """
+    What the per-turn validator answers for one row, or None when it raises.
+    """
+    try:
+        return validator(dict(slots))
+    except (ValueError, TypeError, AttributeError, OverflowError):
+        return None
+
+
+class DifferentialTest(unittest.TestCase):
+    """
+    The column validators must answer every row exactly as the per-turn validators do.
+    """
+
+    ROWS = 5000
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.random = random.Random(20240101)
+        self.today = datetime.date.today()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def date(self):
+        draw = self.random.random()
+        if draw < 0.1:
+            return None
+        if draw < 0.14:
+            return self.random.choice(('garbage', '', '20250101', '2025-13-01', '2023-02-30', '0000-01-01'))
+        offset = datetime.timedelta(days=self.random.randint(-3, 45))
+        if draw < 0.17:
+            # Not a str: its str() is a canonical date, but the per-turn validator cannot parse it.
+            return self.today + offset
+        if draw < 0.2:
+            return (self.today + offset).strftime('%Y/%m/%d')
+        return (self.today + offset).isoformat()
+
+    def assert_identical(self, rows, slot_names, column_validator, validator):
+        columns = {name: [row[name] for row in rows] for name in slot_names}
+        result = column_validator(columns)
+        got = list(bulk_validation.to_validation_results(result))
+        unreadable = 0
+        for index, row in enumerate(rows):
+            expected = scalar(validator, row)
+            if expected is None:
+                unreadable += 1
+                self.assertTrue(result['error'][index], row)
+                self.assertFalse(got[index]['isValid'], row)
+                self.assertIsNone(got[index]['violatedSlot'], row)
+            else:
+                self.assertFalse(result['error'][index], row)
+                self.assertEqual(got[index], expected, row)
+        return unreadable
+
+    def test_book_car(self):
+        rows = [{
+            'PickUpCity': self.random.choice(CITIES),
+            'PickUpDate': self.date(),
+            'ReturnDate': self.date(),
+            'DriverAge': self.random.choice(AGES),
+            'CarType': self.random.choice(CAR_TYPES)
+        } for _ in range(self.ROWS)]
+        unreadable = self.assert_identical(
+            rows, bulk_validation.CAR_SLOTS, bulk_validation.validate_book_car_columns, lambda_function.validate_book_car
+        )
+        # The fixture is meant to exercise the unreadable-row path too.
+        self.assertGreater(unreadable, 0)
+
+    def test_hotel(self):
+        rows = [{
+            'Location': self.random.choice(CITIES),
+            'CheckInDate': self.date(),
+            'Nights': self.random.choice(NIGHTS),
+            'RoomType': self.random.choice(ROOM_TYPES)
+        } for _ in range(self.ROWS)]
+        unreadable = self.assert_identical(
+            rows, bulk_validation.HOTEL_SLOTS, bulk_validation.validate_hotel_columns, lambda_function.validate_hotel
+        )
+        self.assertGreater(unreadable, 0)
+
+    def test_typed_columns(self):
+        pickup = self.today + datetime.timedelta(days=2)
+        columns = {
+            'PickUpCity': (np.array([0, 1, -1, 2]), np.array(['sydney', 'paris', 'melbourne'])),
+            'PickUpDate': np.array(['2000-01-01', 'NaT', pickup.isoformat(), 'NaT'], dtype='datetime64[D]'),
+            'DriverAge': np.array([20, 17, np.nan, 30])
+        }
+        got = list(bulk_validation.to_validation_results(bulk_validation.validate_book_car_columns(columns)))
+        rows = [bulk_validation._row_slots(columns, bulk_validation.CAR_SLOTS, row) for row in range(4)]
+        self.assertEqual(got, [lambda_function.validate_book_car(row) for row in rows])
+
+    def test_date_objects_are_not_read_as_dates(self):
+        pickup = self.today + datetime.timedelta(days=2)
+        returned = pickup + datetime.timedelta(days=40)
+        columns = {'PickUpDate': [pickup, pickup.isoformat()], 'ReturnDate': [returned, returned.isoformat()]}
+        result = bulk_validation.validate_book_car_columns(columns)
+        self.assertEqual(list(result['error']), [True, False])
+        self.assertIsNone(result['violatedSlot'][0])
+        self.assertEqual(result['violatedSlot'][1], 'ReturnDate')
+        with self.assertRaises(TypeError):
+            lambda_function.validate_book_car(bulk_validation._row_slots(columns, bulk_validation.CAR_SLOTS, 0))
+
+    def test_unreadable_row_does_not_stop_the_batch(self):
+        columns = {'PickUpCity': ['sydney', 'sydney'], 'PickUpDate': ['20250101', None], 'DriverAge': ['30', '17']}
+        result = bulk_validation.validate_book_car_columns(columns)
+        self.assertEqual(list(result['error']), [True, False])
+        self.assertEqual(result['code'][0], len(bulk_validation.CAR_RULES) + 1)
+        self.assertEqual(result['violatedSlot'][1], 'DriverAge')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,185 @@
+import datetime
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import event_corpus
+import lambda_function
+
+
+TODAY = datetime.date(2024, 3, 1)
+
+
+def generated(count, seed=0, distribution=None, today=TODAY, **options):
+    output = io.BytesIO()
+    event_corpus.generate(output, count, seed, distribution, today=today, **options)
+    return output.getvalue()
+
+
+def events(data):
+    return [json.loads(line) for line in data.splitlines()]
+
+
+class GenerateTest(unittest.TestCase):
+
+    def test_same_seed_and_today_give_identical_bytes(self):
+        self.assertEqual(generated(500, seed=7), generated(500, seed=7))
+        self.assertNotEqual(generated(500, seed=7), generated(500, seed=8))
+        self.assertNotEqual(generated(500, seed=7), generated(500, seed=7, today=TODAY + datetime.timedelta(days=1)))
+
+    def test_command_line_matches_generate(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'events.ndjson')
+            event_corpus.main(['generate', '--count', '200', '--seed', '3', '--today', TODAY.isoformat(),
+                               '--set', 'missing_slot=0', '-o', path])
+            with open(path, 'rb') as corpus:
+                self.assertEqual(corpus.read(), generated(200, seed=3, distribution={'missing_slot': 0}))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_events_follow_the_schema(self):
+        bot_name, version, intents = event_corpus.load_schema()
+        slot_names = {intent_name: {name for name, _ in slots} for intent_name, slots in intents}
+        for event in events(generated(300)):
+            self.assertEqual(event['bot'], {'name': bot_name, 'alias': '$LATEST', 'version': version})
+            self.assertEqual(set(event['currentIntent']['slots']), slot_names[event['currentIntent']['name']])
+
+    def test_distribution_extremes(self):
+        for event in events(generated(300, distribution={'missing_slot': 1})):
+            self.assertTrue(all(value is None for value in event['currentIntent']['slots'].values()))
+        none_confirmed = {'missing_slot': 0, 'invalid_city': 1, 'confirmation_none': 1, 'auto_populate': 0,
+                          'fulfillment': 0, 'users': 3}
+        for event in events(generated(300, distribution=none_confirmed)):
+            self.assertTrue(all(value is not None for value in event['currentIntent']['slots'].values()))
+            self.assertEqual(event['currentIntent']['confirmationStatus'], 'None')
+            self.assertEqual(event['invocationSource'], 'DialogCodeHook')
+            self.assertIsNone(event['sessionAttributes'])
+            self.assertIn(event['userId'], ('synthetic-0', 'synthetic-1', 'synthetic-2'))
+            for name, value in event['currentIntent']['slots'].items():
+                if 'city' in name.lower() or 'location' in name.lower():
+                    self.assertIn(value, event_corpus.INVALID_CITIES)
+
+    def test_distribution_shares(self):
+        sample = events(generated(4000, seed=11))
+        slots = [value for event in sample for value in event['currentIntent']['slots'].values()]
+        statuses = [event['currentIntent']['confirmationStatus'] for event in sample]
+        self.assertAlmostEqual(slots.count(None) / len(slots), 0.25, delta=0.02)
+        self.assertAlmostEqual(statuses.count('None') / len(statuses), 0.6, delta=0.03)
+        self.assertAlmostEqual(statuses.count('Confirmed') / len(statuses), 0.25, delta=0.03)
+        hooks = [event['invocationSource'] for event in sample]
+        self.assertAlmostEqual(hooks.count('FulfillmentCodeHook') / len(hooks), 0.1, delta=0.02)
+
+    def test_intent_allow_list(self):
+        sample = events(generated(300, intents=['BookCar', 'BookHotel']))
+        self.assertEqual({event['currentIntent']['name'] for event in sample}, {'BookCar', 'BookHotel'})
+        with self.assertRaises(ValueError):
+            generated(1, intents=['BookCar', 'BookSpaceship'])
+
+    def test_dates_are_relative_to_today(self):
+        for event in events(generated(300, distribution={'missing_slot': 0, 'date_boundary': 0})):
+            for name, value in event['currentIntent']['slots'].items():
+                if name in ('CheckInDate', 'PickUpDate', 'Leave_Date'):
+                    offset = (datetime.date.fromisoformat(value) - TODAY).days
+                    self.assertTrue(1 <= offset <= 90, (name, value))
+
+
+class EventCorpusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def corpus(self, data):
+        path = os.path.join(self.directory, 'events.ndjson')
+        with open(path, 'wb') as corpus:
+            corpus.write(data)
+        return event_corpus.EventCorpus(path)
+
+    def test_generated_corpus(self):
+        data = generated(100, seed=5)
+        with self.corpus(data) as corpus:
+            self.assertEqual(len(corpus), 100)
+            self.assertEqual(list(corpus), events(data))
+            self.assertEqual(bytes(corpus.raw(3)), data.splitlines()[3])
+
+    def test_blank_lines_are_skipped(self):
+        with self.corpus(b'\n{"a":1}\n\n{"b":2}\n  \r\n{"c":3}\r\n\n') as corpus:
+            self.assertEqual(list(corpus), [{'a': 1}, {'b': 2}, {'c': 3}])
+
+    def test_last_line_without_newline(self):
+        with self.corpus(b'{"a":1}\n{"b":2}') as corpus:
+            self.assertEqual(list(corpus), [{'a': 1}, {'b': 2}])
+            self.assertEqual(bytes(corpus.raw(1)), b'{"b":2}')
+
+    def test_empty_file(self):
+        for data in (b'', b'\n\n'):
+            with self.corpus(data) as corpus:
+                self.assertEqual(len(corpus), 0)
+                self.assertEqual(list(corpus), [])
+                with self.assertRaises(IndexError):
+                    corpus[0]
+
+    def test_negative_indexes(self):
+        with self.corpus(b'{"a":1}\n{"b":2}\n{"c":3}\n') as corpus:
+            self.assertEqual(corpus[-1], {'c': 3})
+            self.assertEqual(corpus[-3], {'a': 1})
+            for index in (-4, 3):
+                with self.assertRaises(IndexError):
+                    corpus[index]
+
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'events.ndjson')
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.directory)
+
+    def replay(self, handler, **options):
+        with open(self.path, 'wb') as corpus:
+            corpus.write(generated(600, seed=2, **options))
+        return event_corpus.replay(self.path, handler)
+
+    def test_unsupported_intents_are_counted_apart_from_errors(self):
+        def handler(event, context):
+            if event['userId'] == 'synthetic-0':
+                raise Exception('something else went wrong')
+            return lambda_function.dispatch(event)
+
+        result = self.replay(handler, distribution={'users': 4})
+        outcomes = result['outcomes']
+        with open(self.path, 'rb') as corpus:
+            sample = events(corpus.read())
+        failing = sum(event['userId'] == 'synthetic-0' for event in sample)
+        planes = sum(event['userId'] != 'synthetic-0' and event['currentIntent']['name'] == 'BookPlane'
+                     for event in sample)
+        self.assertGreater(planes, 0)
+        self.assertEqual(sum(outcomes.values()), result['events'])
+        self.assertEqual(outcomes['UnsupportedIntent'], planes)
+        self.assertEqual(result['unsupported_intents'], {'BookPlane': planes})
+        # Only the handler's own failures are left as Exception.
+        self.assertEqual(outcomes['Exception'], failing)
+
+    def test_supported_intents_only(self):
+        result = self.replay(lambda event, context: lambda_function.dispatch(event), intents=['BookCar', 'BookHotel'])
+        self.assertNotIn('UnsupportedIntent', result['outcomes'])
+        self.assertEqual(result['unsupported_intents'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
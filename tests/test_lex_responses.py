@@ -0,0 +1,119 @@
+import copy
+import json
+import logging
+import os
+import pickle
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lambda_function
+import lex_responses
+
+
+SESSION_ATTRIBUTES = {
+    'currentReservation': json.dumps({'ReservationType': 'Hotel', 'Location': 'Zürich', 'RoomType': 'königsuite'}),
+    'note': 'café ☕ 東京 "quoted" \\ back\nslash',
+}
+SLOTS = {'Location': 'Zürich', 'CheckInDate': None, 'Nights': '3', 'RoomType': 'king'}
+
+
+class EncodeResponseTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def assert_round_trip(self, response):
+        encoded = lex_responses.encode_response(response)
+        self.assertIsInstance(encoded, bytes)
+        self.assertEqual(json.loads(encoded.decode('utf-8')), response)
+        return encoded
+
+    def city_message(self):
+        # Formatted per turn, so never interned.
+        message = lambda_function.validate_hotel({'Location': 'Zürich'})['message']
+        self.assertNotIn(message['content'], lex_responses._INTERNED_MESSAGES)
+        return message
+
+    def test_elicit_slot(self):
+        reprompt = lambda_function.build_validation_result(
+            False, 'Nights',
+            'You can make a reservations from one to thirty nights.  How many nights would you like to stay for?'
+        )['message']
+        for message in (reprompt, self.city_message(), lex_responses.ASK_GUESTS):
+            for attributes in (SESSION_ATTRIBUTES, {}, None):
+                with self.subTest(message=message['content'], attributes=attributes):
+                    self.assert_round_trip(
+                        lambda_function.elicit_slot(attributes, 'BookHotel', SLOTS, 'Nights', message)
+                    )
+        # The cached fragment is keyed on the slot and intent too.
+        self.assert_round_trip(lambda_function.elicit_slot(SESSION_ATTRIBUTES, 'BookCar', {}, 'CarType', reprompt))
+
+    def test_confirm_intent(self):
+        for message in (lex_responses.ASK_CAR_CITY, self.city_message()):
+            with self.subTest(message=message['content']):
+                self.assert_round_trip(lambda_function.confirm_intent(SESSION_ATTRIBUTES, 'BookCar', SLOTS, message))
+
+    def test_close(self):
+        for message in (lex_responses.RESERVATION_PLACED, lex_responses.HOTEL_RESERVATION_PLACED, self.city_message()):
+            for state in ('Fulfilled', 'Failed'):
+                with self.subTest(message=message['content'], state=state):
+                    self.assert_round_trip(lambda_function.close(SESSION_ATTRIBUTES, state, message))
+
+    def test_delegate(self):
+        self.assert_round_trip(lambda_function.delegate(SESSION_ATTRIBUTES, SLOTS))
+        self.assert_round_trip(lambda_function.delegate({}, None))
+
+    def test_non_ascii_is_written_as_utf8(self):
+        encoded = self.assert_round_trip(lambda_function.delegate(SESSION_ATTRIBUTES, SLOTS))
+        self.assertIn('Zürich'.encode('utf-8'), encoded)
+        self.assertIn('東京'.encode('utf-8'), encoded)
+
+    def test_unknown_shapes_fall_back_to_json(self):
+        for response in ({'sessionAttributes': {'a': 'ü'}},
+                         {'sessionAttributes': {}, 'dialogAction': {'type': 'ElicitIntent', 'message': None}},
+                         {'sessionAttributes': {}, 'dialogAction': None}):
+            with self.subTest(response=response):
+                self.assert_round_trip(response)
+
+    def test_unserializable_values_raise_type_error(self):
+        with self.assertRaises(TypeError):
+            lex_responses.encode_delegate({'when': object()}, SLOTS)
+
+
+class SharedMessageTest(unittest.TestCase):
+
+    def test_interned_messages_are_shared(self):
+        self.assertIs(lex_responses.plain_text('How many guests?'), lex_responses.ASK_GUESTS)
+        self.assertIsNot(lex_responses.plain_text('Hello'), lex_responses.plain_text('Hello'))
+
+    def test_interned_messages_are_read_only(self):
+        message = lex_responses.ASK_GUESTS
+        mutations = (
+            lambda: message.__setitem__('content', 'changed'),
+            lambda: message.__delitem__('content'),
+            lambda: message.update(content='changed'),
+            lambda: message.setdefault('extra', 1),
+            lambda: message.pop('content'),
+            message.popitem,
+            message.clear,
+        )
+        for mutate in mutations:
+            with self.assertRaises(TypeError):
+                mutate()
+        self.assertEqual(message, {'contentType': 'PlainText', 'content': 'How many guests?'})
+
+    def test_copies_are_plain_dicts(self):
+        for duplicate in (copy.copy(lex_responses.ASK_GUESTS), copy.deepcopy(lex_responses.ASK_GUESTS),
+                          pickle.loads(pickle.dumps(lex_responses.ASK_GUESTS))):
+            self.assertIs(type(duplicate), dict)
+            duplicate['content'] = 'changed'
+        self.assertEqual(lex_responses.ASK_GUESTS['content'], 'How many guests?')
+
+
+if __name__ == '__main__':
+    unittest.main()